@@ -4,6 +4,7 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
+from api.v1.auth.auth import PathMatcher
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
 
@@ -23,6 +24,11 @@ elif AUTH_TYPE == 'basic_auth':
     from api.v1.auth.basic_auth import BasicAuth
     auth = BasicAuth()
 
+# Paths that don't require authentication, compiled once
+excluded_paths = PathMatcher(['/api/v1/status/',
+                              '/api/v1/unauthorized/',
+                              '/api/v1/forbidden/'])
+
 
 @app.before_request
 def before_request() -> str:
@@ -30,11 +36,7 @@ def before_request() -> str:
     """
     if auth is None:
         return
-        
-    excluded_paths = ['/api/v1/status/', 
-                      '/api/v1/unauthorized/', 
-                      '/api/v1/forbidden/']
-    
+
     if not auth.require_auth(request.path, excluded_paths):
         return
         
@@ -4,18 +4,130 @@ Auth module for the API
 """
 from flask import request
 from typing import List, TypeVar
+from functools import wraps
+
+
+def memoize_current_user(current_user):
+    """Decorator caching the user resolved by current_user on the request
+
+    The first call for a request resolves the user, later calls with the
+    same request and Auth instance return it without any lookup.
+    """
+    @wraps(current_user)
+    def wrapper(self, request=None):
+        if request is None:
+            return current_user(self, request)
+        cached = getattr(request, '_auth_current_user', None)
+        if cached is not None and cached[0] is self:
+            return cached[1]
+        user = current_user(self, request)
+        try:
+            request._auth_current_user = (self, user)
+        except AttributeError:
+            pass
+        return user
+    wrapper.memoized = True
+    return wrapper
+
+
+class PathMatcher:
+    """Precompiled set of paths that don't require authentication.
+
+    Plain entries go into a set of slash-terminated paths and entries
+    ending with '*' into a character trie of their prefixes, so matching
+    a path costs one set lookup plus one walk over the path, whatever
+    the number of entries.
+    """
+
+    # Trie key marking the end of a wildcard prefix
+    _END = None
+
+    def __init__(self, excluded_paths: List[str] = None):
+        """Compiles a list of excluded paths.
+
+        Args:
+            excluded_paths (List[str]): Paths, optionally ending with '*'
+        """
+        self._exact = set()
+        self._prefixes = {}
+        self._size = 0
+        for excluded_path in excluded_paths or []:
+            self.add(excluded_path)
+
+    def add(self, excluded_path: str):
+        """Adds one excluded path.
+
+        Args:
+            excluded_path (str): Path, optionally ending with '*'
+        """
+        if excluded_path.endswith('*'):
+            node = self._prefixes
+            for char in excluded_path[:-1]:
+                node = node.setdefault(char, {})
+            if self._END in node:
+                return
+            node[self._END] = True
+        else:
+            if not excluded_path.endswith('/'):
+                excluded_path += '/'
+            if excluded_path in self._exact:
+                return
+            self._exact.add(excluded_path)
+        self._size += 1
+
+    def __len__(self) -> int:
+        """Returns the number of compiled entries.
+        """
+        return self._size
+
+    def match(self, path: str) -> bool:
+        """Tells if a path is excluded from authentication.
+
+        Args:
+            path (str): The requested path
+
+        Returns:
+            bool: True if the path matches an excluded entry
+        """
+        if not path.endswith('/'):
+            path += '/'
+
+        if path in self._exact:
+            return True
+
+        node = self._prefixes
+        if self._END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
 
 
 class Auth:
     """Auth class to manage API authentication
     """
 
+    def __init_subclass__(cls, **kwargs):
+        """Routes the current_user of every subclass through the
+        request-scoped cache
+        """
+        super().__init_subclass__(**kwargs)
+        current_user = cls.__dict__.get('current_user')
+        if current_user is not None and \
+                not getattr(current_user, 'memoized', False):
+            cls.current_user = memoize_current_user(current_user)
+
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """Determines if authentication is required for a given path
         
         Args:
             path: The path to check
-            excluded_paths: List of paths that don't require authentication
+            excluded_paths: Paths that don't require authentication, as a
+                list or ideally compiled once into a PathMatcher
             
         Returns:
             True if path requires authentication, False otherwise
@@ -25,6 +137,9 @@ class Auth:
             
         if excluded_paths is None or len(excluded_paths) == 0:
             return True
+
+        if isinstance(excluded_paths, PathMatcher):
+            return not excluded_paths.match(path)
             
         # Ensure path ends with / for consistent comparison
         if not path.endswith('/'):
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Verified-credential cache module for the API
+"""
+from collections import OrderedDict
+from typing import TypeVar
+from models.user import User
+import hashlib
+import hmac
+import os
+import time
+
+
+class CredentialCache:
+    """Bounded LRU cache of verified Authorization headers
+
+    Maps a keyed digest of the header to the id of the user it resolved
+    to, so the header itself is never kept in memory. An entry is only
+    trusted while it is younger than its TTL and while the user still
+    exists with the same email and password hash it was verified with.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        """Initialize a CredentialCache
+
+        Args:
+            max_size: Maximum number of cached headers, 0 disables caching
+            ttl: Lifetime of an entry in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+
+    def _digest(self, authorization_header: str) -> bytes:
+        """Keyed digest of an Authorization header
+        """
+        return hmac.new(self._key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> TypeVar('User'):
+        """Returns the user cached for an Authorization header
+
+        Args:
+            authorization_header: The Authorization header string
+
+        Returns:
+            User instance or None on a miss
+        """
+        if self.max_size <= 0:
+            return None
+        digest = self._digest(authorization_header)
+        entry = self._entries.get(digest)
+        if entry is not None:
+            user_id, email, password, expires_at = entry
+            user = User.get(user_id)
+            if user is not None and expires_at > time.monotonic() and \
+                    user.email == email and user._password is password:
+                try:
+                    self._entries.move_to_end(digest)
+                except KeyError:
+                    # Evicted by a concurrent request in the meantime
+                    pass
+                self.hits += 1
+                return user
+            self._entries.pop(digest, None)
+        self.misses += 1
+        return None
+
+    def put(self, authorization_header: str, user: TypeVar('User')):
+        """Caches the user verified for an Authorization header
+
+        Args:
+            authorization_header: The Authorization header string
+            user: The User instance the credentials resolved to
+        """
+        if self.max_size <= 0:
+            return
+        digest = self._digest(authorization_header)
+        self._entries.pop(digest, None)
+        self._entries[digest] = (user.id, user.email, user._password,
+                                 time.monotonic() + self.ttl)
+        while len(self._entries) > self.max_size:
+            try:
+                self._entries.popitem(last=False)
+            except KeyError:
+                break
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every cached entry
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the cache counters
+
+        Returns:
+            Dictionary with size, hits, misses and evictions
+        """
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -4,6 +4,7 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
+from api.v1.auth.auth import PathMatcher
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
 import os
@@ -35,6 +36,15 @@ else:
     from api.v1.auth.auth import Auth
     auth = Auth()
 
+# Paths that don't require authentication, compiled once
+excluded_paths = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/',
+    '/api/v1/auth_session/logout/'
+])
+
 
 @app.before_request
 def before_request():
@@ -48,15 +58,6 @@ def before_request():
     if auth is None:
         return
 
-    # List of paths that don't require authentication
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/',
-        '/api/v1/auth_session/logout/'
-    ]
-
     # Check if the current path requires authentication
     if not auth.require_auth(request.path, excluded_paths):
         return
@@ -66,12 +67,11 @@ def before_request():
             auth.session_cookie(request) is None):
         abort(401)
 
-    # Check if current user can be determined
-    if auth.current_user(request) is None:
-        abort(403)
-
-    # Store current user in request for use in route handlers
+    # Resolve the current user once and store it in request for use in
+    # route handlers
     request.current_user = auth.current_user(request)
+    if request.current_user is None:
+        abort(403)
 
 
 @app.errorhandler(404)
@@ -3,14 +3,34 @@
 Basic authentication module for the API
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
 from typing import TypeVar
 from models.user import User
+from os import getenv
 import base64
 
 
 class BasicAuth(Auth):
     """BasicAuth class that inherits from Auth
     """
+
+    def __init__(self):
+        """Initialize a BasicAuth instance
+
+        Verified Authorization headers are cached for BASIC_AUTH_CACHE_TTL
+        seconds (default 60), up to BASIC_AUTH_CACHE_SIZE entries (default
+        1024, 0 disables the cache).
+        """
+        super().__init__()
+        try:
+            max_size = int(getenv('BASIC_AUTH_CACHE_SIZE'))
+        except (TypeError, ValueError):
+            max_size = 1024
+        try:
+            ttl = int(getenv('BASIC_AUTH_CACHE_TTL'))
+        except (TypeError, ValueError):
+            ttl = 60
+        self.credential_cache = CredentialCache(max_size, ttl)
     
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
@@ -128,6 +148,12 @@ class BasicAuth(Auth):
         auth_header = self.authorization_header(request)
         if auth_header is None:
             return None
+
+        # Repeated requests with the same verified header skip decoding,
+        # user search and password hashing
+        user = self.credential_cache.get(auth_header)
+        if user is not None:
+            return user
             
         # Extract the Base64 part
         base64_auth = self.extract_base64_authorization_header(auth_header)
@@ -144,5 +170,8 @@ class BasicAuth(Auth):
         if user_email is None or user_pwd is None:
             return None
             
-        # Get and return the user object
-        return self.user_object_from_credentials(user_email, user_pwd)
\ No newline at end of file
+        # Get the user object and remember the verified header
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(auth_header, user)
+        return user
\ No newline at end of file
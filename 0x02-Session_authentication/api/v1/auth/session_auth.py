@@ -3,7 +3,14 @@
 Session authentication module for the API
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_snapshot import restore_snapshot, write_snapshot
+from api.v1.auth.session_store import SessionRecord, session_store_from_env
+from api.v1.auth.session_token import SessionTokenSigner
 from models.user import User
+from os import getenv
+from time import time
+import atexit
+import threading
 import uuid
 
 
@@ -12,9 +19,57 @@ class SessionAuth(Auth):
     SessionAuth class that inherits from Auth.
     This class handles session-based authentication mechanism.
     It manages session IDs and maps them to user IDs for authentication.
+
+    Sessions live in a SessionStore shared by every instance, selected
+    by the SESSION_STORE environment variable when the first instance
+    is created.
+
+    When SESSION_SNAPSHOT is set, the store is restored from that
+    snapshot file when it is created and saved back to it at exit, so
+    sessions survive a restart.
+
+    With SESSION_TOKENS=signed, session IDs are instead stateless tokens
+    signed with SESSION_SECRET, carrying the user ID and the expiration
+    time (SESSION_DURATION seconds, one day by default). They are
+    validated without any store lookup.
     """
 
-    user_id_by_session_id = {}
+    user_id_by_session_id = None
+    _store_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Initialize the SessionAuth instance and the shared session store.
+        """
+        super().__init__()
+        with SessionAuth._store_lock:
+            if SessionAuth.user_id_by_session_id is None:
+                store = session_store_from_env()
+                snapshot = getenv('SESSION_SNAPSHOT')
+                if snapshot:
+                    restore_snapshot(store, snapshot, self.restore_cutoff())
+                    atexit.register(write_snapshot, store, snapshot)
+                SessionAuth.user_id_by_session_id = store
+
+        self.token_signer = None
+        if getenv('SESSION_TOKENS') == 'signed':
+            try:
+                lifetime = int(getenv('SESSION_DURATION'))
+            except (TypeError, ValueError):
+                lifetime = 0
+            secret = getenv('SESSION_SECRET')
+            self.token_signer = SessionTokenSigner(
+                secret.encode() if secret else None,
+                lifetime if lifetime > 0 else 86400)
+
+    def restore_cutoff(self) -> float:
+        """
+        Timestamp before which restored sessions are skipped.
+
+        Returns:
+            float: None, sessions of SessionAuth never expire
+        """
+        return None
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -27,8 +82,9 @@ class SessionAuth(Auth):
             str: The generated Session ID, or None if user_id is invalid
 
         The method validates the user_id parameter and generates a unique
-        session ID using uuid4(). The session ID is stored as a key in the
-        user_id_by_session_id dictionary with user_id as the value.
+        session ID using uuid4(). The session ID is stored in the
+        user_id_by_session_id store with a record of user_id and the
+        creation time.
         """
         if user_id is None:
             return None
@@ -36,14 +92,30 @@ class SessionAuth(Auth):
         if not isinstance(user_id, str):
             return None
 
+        if self.token_signer is not None:
+            return self.token_signer.issue(user_id)
+
         # Generate a Session ID using uuid4()
         session_id = str(uuid.uuid4())
 
-        # Store the session_id as key and user_id as value
-        self.user_id_by_session_id[session_id] = user_id
+        # Store the session_id as key and the user_id record as value
+        evicted = self.user_id_by_session_id.set(
+            session_id, SessionRecord(user_id, time()))
+        if evicted:
+            self.sessions_removed(evicted)
 
         return session_id
 
+    def sessions_removed(self, session_ids: list) -> None:
+        """
+        Called with the sessions the store removed by itself, evicted to
+        make room for a new one or expired. Nothing to do here,
+        subclasses persisting sessions record their removal.
+
+        Args:
+            session_ids (list): The session IDs removed
+        """
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
         Returns a User ID based on a Session ID.
@@ -57,8 +129,8 @@ class SessionAuth(Auth):
 
         The method validates the session_id parameter
         and uses the get() method to safely retrieve
-        the user_id from the user_id_by_session_id dictionary.
-        Returns None if session_id is invalid or not found in the dictionary.
+        the user_id from the user_id_by_session_id store.
+        Returns None if session_id is invalid or not found in the store.
         """
         if session_id is None:
             return None
@@ -66,8 +138,12 @@ class SessionAuth(Auth):
         if not isinstance(session_id, str):
             return None
 
-        # Use .get() to safely access the dictionary
-        return self.user_id_by_session_id.get(session_id)
+        if self.token_signer is not None:
+            return self.token_signer.user_id(session_id)
+
+        # Use .get() to safely access the store
+        record = self.user_id_by_session_id.get(session_id)
+        return record[0] if record is not None else None
 
     def current_user(self, request=None):
         """
@@ -116,9 +192,9 @@ class SessionAuth(Auth):
             bool: True if session was successfully destroyed, False otherwise
 
         This method handles user logout by removing the session ID from the
-        user_id_by_session_id dictionary. It validates the request, extracts
+        user_id_by_session_id store. It validates the request, extracts
         the session ID from the cookie, verifies it exists in the session
-        dictionary, and then removes it.
+        store, and then removes it.
         """
         # Check if request is None
         if request is None:
@@ -138,7 +214,44 @@ class SessionAuth(Auth):
         if user_id is None:
             return False
 
-        # Delete the session ID from the dictionary
-        del self.user_id_by_session_id[session_id]
+        # Signed tokens are not stored, they are revoked instead
+        if self.token_signer is not None:
+            return self.token_signer.revoke(session_id)
 
-        return True
+        # Delete the session ID from the store
+        return self.user_id_by_session_id.delete(session_id)
+
+    def user_sessions(self, user_id: str = None) -> list:
+        """
+        Lists the sessions of a user.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            list: The session IDs of the user, empty for signed tokens
+            which are not stored
+        """
+        if not isinstance(user_id, str) or self.token_signer is not None:
+            return []
+        return self.user_id_by_session_id.user_sessions(user_id)
+
+    def destroy_all_sessions(self, user_id: str = None) -> int:
+        """
+        Deletes every session of a user / logout everywhere.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            int: The number of sessions destroyed
+
+        Uses the user ID -> session IDs index of the store, so the cost
+        only depends on the number of sessions of that user.
+        """
+        if not isinstance(user_id, str):
+            return 0
+        if self.token_signer is not None:
+            self.token_signer.revoke_user(user_id)
+            return 0
+        return len(self.user_id_by_session_id.delete_user(user_id))
@@ -1,35 +1,259 @@
 #!/usr/bin/env python3
 """
-UserSession module for database-backed session storage
+Session database authentication module for the API
 """
-try:
-    from models.base import Base
-except ImportError:
-    # Fallback if Base import fails
-    Base = object
+from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_store import SessionRecord
+from calendar import timegm
+from collections import deque
+from datetime import datetime
+from models.base import LogStorage, TIMESTAMP_FORMAT, storage_for
+from models.user_session import UserSession
+from os import getenv
+from time import time
+import atexit
+import logging
+import threading
 
+logger = logging.getLogger(__name__)
 
-class UserSession(Base):
+
+class SessionDBAuth(SessionExpAuth):
     """
-    UserSession class that inherits from Base.
-    This class represents a user session stored in the database,
-    providing persistence for session data beyond application restarts.
+    SessionDBAuth class that inherits from SessionExpAuth.
+    This class persists sessions as UserSession objects so they survive
+    application restarts.
+
+    Sessions are read from the session store like in SessionExpAuth.
+    Creates and destroys are queued and a background thread appends them
+    to the UserSession log in one batch every SESSION_DB_FLUSH_MS
+    milliseconds (default 100), so a login never waits for a disk write.
+    With SESSION_DB_FLUSH_MS=0 every change is written synchronously.
+    In sliding mode, the touches queued during an interval are written
+    with the same batch, one record per touched session. Sessions the
+    store expires or evicts get a tombstone like destroyed ones, so they
+    stay removed after a restart and the log can be compacted.
     """
 
-    def __init__(self, *args: list, **kwargs: dict):
+    def __init__(self):
+        """
+        Initialize the SessionDBAuth instance.
+
+        Loads the sessions persisted by previous runs, skipping expired
+        ones, and starts the write-behind thread.
+        """
+        super().__init__()
+
+        try:
+            self.flush_interval = int(getenv('SESSION_DB_FLUSH_MS')) / 1000
+        except (TypeError, ValueError):
+            self.flush_interval = 0.1
+
+        self.storage = storage_for('UserSession') or \
+            LogStorage('.db_UserSession.jsonl')
+        self._pending = deque()
+        self._touched = {}
+        # Guards the queue of touched sessions against a flush swapping it
+        self._touched_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.load_sessions()
+
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def load_sessions(self):
+        """
+        Loads the persisted sessions into memory.
+
+        Returns:
+            int: The number of sessions loaded
+        """
+        now = time()
+        loaded = 0
+        # Expired sessions, and sessions evicted by the limits of the
+        # store, are dropped from the log too
+        expired = []
+        evicted = []
+        for session_id, record in self.storage.load().items():
+            created_at = timegm(datetime.strptime(
+                record['created_at'], TIMESTAMP_FORMAT).timetuple())
+            expiration_time = created_at + self.session_duration
+            if self.session_duration > 0 and expiration_time < now:
+                expired.append(session_id)
+                continue
+            evicted += self.user_id_by_session_id.set(
+                session_id, SessionRecord(record['user_id'], created_at))
+            loaded += 1
+        self.sessions_removed(expired + evicted)
+        return loaded - len(evicted)
+
+    def create_session(self, user_id=None):
+        """
+        Creates and stores a new UserSession for a user_id.
+
+        Args:
+            user_id (str): The user ID to create a session for
+
+        Returns:
+            str: The generated Session ID, or None if creation fails
+        """
+        session_id = super().create_session(user_id)
+        if session_id is None or self.token_signer is not None:
+            return session_id
+
+        record = self.user_id_by_session_id.get(session_id)
+        if record is None:
+            # Already evicted by a concurrent create
+            return session_id
+        self._write([["set", self._serialize(session_id, record)]])
+        return session_id
+
+    def touch_session(self, session_id, now):
         """
-        Initialize a UserSession instance.
-        
+        Records the activity of a session and queues its new record.
+
         Args:
-            *args: Variable length argument list
-            **kwargs: Arbitrary keyword arguments
-            
-        Initializes the UserSession with user_id and session_id attributes.
-        Like the User class, it calls the parent Base class constructor
-        and then sets up the specific attributes for session management.
-        """
-        super().__init__(*args, **kwargs)
-        
-        # Initialize session-specific attributes
-        self.user_id = kwargs.get('user_id')
-        self.session_id = kwargs.get('session_id')
\ No newline at end of file
+            session_id (str): The session ID
+            now (float): Timestamp of the activity
+        """
+        super().touch_session(session_id, now)
+        with self._touched_lock:
+            self._touched[session_id] = None
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def destroy_session(self, request=None):
+        """
+        Destroys the UserSession based on the Session ID from the
+        request cookie.
+
+        Args:
+            request: Flask request object
+
+        Returns:
+            bool: True if session was successfully destroyed, False otherwise
+        """
+        session_id = self.session_cookie(request)
+        if not super().destroy_session(request):
+            return False
+        if self.token_signer is not None:
+            return True
+        self._write([["del", session_id]])
+        return True
+
+    def destroy_all_sessions(self, user_id=None):
+        """
+        Destroys every UserSession of a user.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            int: The number of sessions destroyed
+        """
+        if not isinstance(user_id, str) or self.token_signer is not None:
+            return super().destroy_all_sessions(user_id)
+        session_ids = self.user_id_by_session_id.delete_user(user_id)
+        self.sessions_removed(session_ids)
+        return len(session_ids)
+
+    def sessions_removed(self, session_ids):
+        """
+        Queues a tombstone for each session the store removed.
+
+        Args:
+            session_ids (list): The session IDs removed
+        """
+        if session_ids:
+            self._write([["del", session_id] for session_id in session_ids])
+
+    def _write(self, entries: list):
+        """
+        Queues log entries, or writes them right away in synchronous mode.
+        """
+        self._pending.extend(entries)
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every queued create and destroy to storage in one batch.
+
+        Entries that could not be written stay queued for the next flush.
+
+        Returns:
+            int: The number of entries written
+        """
+        with self._flush_lock:
+            entries = []
+            while self._pending:
+                entries.append(self._pending.popleft())
+            try:
+                self.storage.write_batch(entries)
+            except BaseException:
+                self._pending.extendleft(reversed(entries))
+                raise
+            # Touches are written after the creates and destroys queued
+            # before them, and only for sessions still live
+            with self._touched_lock:
+                touched, self._touched = self._touched, {}
+            updates = []
+            for session_id in touched:
+                record = self.user_id_by_session_id.get(session_id)
+                if type(record) is SessionRecord:
+                    updates.append(["set", self._serialize(session_id,
+                                                           record)])
+            try:
+                self.storage.write_batch(updates, created=False)
+            except BaseException:
+                with self._touched_lock:
+                    self._touched.update(touched)
+                raise
+            # Counted from the store: a session created while the log was
+            # compacted may have been written twice
+            self.storage.maybe_compact(self._live_records,
+                                       len(self.user_id_by_session_id))
+        return len(entries) + len(updates)
+
+    @staticmethod
+    def _serialize(session_id: str, record: SessionRecord) -> dict:
+        """
+        Serializes a session as a UserSession.
+        """
+        return UserSession(
+            id=session_id, user_id=record.user_id, session_id=session_id,
+            created_at=datetime.utcfromtimestamp(int(record.created_at))
+        ).to_json()
+
+    def _live_records(self):
+        """
+        Serializes every live session, for log compaction.
+        """
+        for session_id, record in self.user_id_by_session_id.items():
+            if type(record) is SessionRecord:
+                yield self._serialize(session_id, record)
+
+    def _flush_loop(self):
+        """
+        Background thread flushing the queue every flush_interval.
+        """
+        while not self._stopped.wait(self.flush_interval):
+            if self._pending or self._touched:
+                try:
+                    self.flush()
+                except Exception:
+                    # The thread must survive, e.g. a full disk: the
+                    # entries stay queued and the next flush retries
+                    logger.exception("Cannot write the sessions log")
+
+    def close(self):
+        """
+        Stops the write-behind thread and writes what is still queued.
+        """
+        self._stopped.set()
+        self.flush()
+        self.storage.close()
@@ -3,8 +3,10 @@
 Session expiration authentication module for the API
 """
 from api.v1.auth.session_auth import SessionAuth
-from datetime import datetime, timedelta
+from api.v1.auth.session_store import SessionRecord
 from os import getenv
+from time import time
+import threading
 
 
 class SessionExpAuth(SessionAuth):
@@ -13,8 +15,38 @@ class SessionExpAuth(SessionAuth):
     This class adds session expiration functionality to the basic
     session authentication mechanism. Sessions automatically expire
     after a configurable duration.
+
+    Expired sessions are also removed from the session store: creates
+    and lookups ask the store to expire the sessions older than
+    session_duration, at most once every SWEEP_INTERVAL seconds, so the
+    store stays bounded by the sessions created during the last
+    session_duration seconds.
+
+    With SESSION_SLIDING set, sessions expire after session_duration
+    seconds without activity instead: the timestamp of a session is its
+    last activity. To avoid a write per request, a session is only
+    touched once SESSION_TOUCH_FRACTION (default 0.1) of its lifetime
+    has passed since its timestamp, so a session costs at most one touch
+    every session_duration * SESSION_TOUCH_FRACTION seconds. Touches of
+    persistent stores are queued and written in one batch per sweep.
     """
 
+    # Minimum number of seconds between two sweeps of the store
+    SWEEP_INTERVAL = 1
+
+    # Number of sessions removed by the sweeper
+    expired_count = 0
+
+    # Number of valid lookups and of touches written, in sliding mode
+    validated_count = 0
+    touched_count = 0
+
+    # Timestamp of the next sweep
+    _next_sweep = 0
+
+    # Held by the thread sweeping the store
+    _sweep_lock = threading.Lock()
+
     def __init__(self):
         """
         Initialize the SessionExpAuth instance.
@@ -23,8 +55,6 @@ class SessionExpAuth(SessionAuth):
         environment variable. If the environment variable doesn't exist
         or can't be parsed to an integer, assigns 0 (no expiration).
         """
-        super().__init__()
-
         try:
             # Get SESSION_DURATION from environment and cast to int
             session_duration = getenv('SESSION_DURATION')
@@ -33,6 +63,30 @@ class SessionExpAuth(SessionAuth):
             # If SESSION_DURATION doesn't exist or can't be parsed to int
             self.session_duration = 0
 
+        self.sliding = bool(getenv('SESSION_SLIDING'))
+        try:
+            self.touch_fraction = float(getenv('SESSION_TOUCH_FRACTION'))
+        except (TypeError, ValueError):
+            self.touch_fraction = 0.1
+        self._pending_touches = {}
+        # Guards the queue of touches against a flush swapping it
+        self._touch_lock = threading.Lock()
+
+        # Set first, restoring a snapshot skips the expired sessions
+        super().__init__()
+
+    def restore_cutoff(self):
+        """
+        Timestamp before which restored sessions are skipped.
+
+        Returns:
+            float: Creation time of the oldest live session, None if
+            sessions never expire
+        """
+        if self.session_duration <= 0:
+            return None
+        return time() - self.session_duration
+
     def create_session(self, user_id=None):
         """
         Creates a Session ID with expiration data for a user_id.
@@ -43,10 +97,9 @@ class SessionExpAuth(SessionAuth):
         Returns:
             str: The generated Session ID, or None if creation fails
 
-        This method overloads the create_session method from SessionAuth.
-        It creates a session ID using the parent class method, then stores
-        additional metadata including the creation timestamp for expiration
-        tracking.
+        This method overloads the create_session method from SessionAuth,
+        whose SessionRecord already holds the creation timestamp used for
+        expiration tracking, and drops the sessions that have expired.
         """
         # Create a Session ID by calling the parent class method
         session_id = super().create_session(user_id)
@@ -55,17 +108,89 @@ class SessionExpAuth(SessionAuth):
         if session_id is None:
             return None
 
-        # Create session dictionary with user_id and creation timestamp
-        session_dict = {
-            'user_id': user_id,
-            'created_at': datetime.now()
-        }
-
-        # Store the session dictionary using session_id as key
-        self.user_id_by_session_id[session_id] = session_dict
+        if self.session_duration > 0 and self.token_signer is None:
+            self.sweep_expired_sessions()
 
         return session_id
 
+    def sweep_expired_sessions(self, now=None, force=False):
+        """
+        Removes the sessions that have expired.
+
+        Args:
+            now (float): Current timestamp, defaults to time()
+            force (bool): Sweep even if the last sweep is recent
+
+        Returns:
+            int: The number of sessions removed
+        """
+        if self.session_duration <= 0:
+            return 0
+        if now is None:
+            now = time()
+        if not force and now < SessionExpAuth._next_sweep:
+            return 0
+        # Requests arriving during a sweep don't wait for it
+        if not self._sweep_lock.acquire(blocking=force):
+            return 0
+        try:
+            SessionExpAuth._next_sweep = now + self.SWEEP_INTERVAL
+            # Written first so the sweep sees the latest activity
+            self.flush_touches()
+            removed = self.user_id_by_session_id.expire(
+                now - self.session_duration)
+            SessionExpAuth.expired_count += len(removed)
+            if removed:
+                self.sessions_removed(removed)
+        finally:
+            self._sweep_lock.release()
+        return len(removed)
+
+    def touch_session(self, session_id, now):
+        """
+        Records the activity of a session, in sliding mode.
+
+        Args:
+            session_id (str): The session ID
+            now (float): Timestamp of the activity
+        """
+        store = self.user_id_by_session_id
+        if store.persistent:
+            with self._touch_lock:
+                self._pending_touches[session_id] = now
+        elif store.touch(session_id, now):
+            SessionExpAuth.touched_count += 1
+
+    def flush_touches(self):
+        """
+        Writes the queued touches to the store in one batch.
+
+        Returns:
+            int: The number of touches written
+        """
+        if not self._pending_touches:
+            return 0
+        with self._touch_lock:
+            touches, self._pending_touches = self._pending_touches, {}
+        self.user_id_by_session_id.touch_many(touches)
+        SessionExpAuth.touched_count += len(touches)
+        return len(touches)
+
+    def session_stats(self):
+        """
+        Returns the session counters.
+
+        Returns:
+            dict: Live sessions, sessions removed once expired, and in
+            sliding mode valid lookups and touches written
+        """
+        return {
+            'live': len(self.user_id_by_session_id),
+            'expired': self.expired_count,
+            'validated': self.validated_count,
+            'touched': self.touched_count
+        }
+
     def user_id_for_session_id(self, session_id=None):
         """
         Returns a User ID based on a Session ID with expiration checking.
@@ -80,36 +205,40 @@ class SessionExpAuth(SessionAuth):
         This method overloads the user_id_for_session_id
         method from SessionAuth.
         It adds expiration logic to validate that sessions haven't exceeded
-        their configured duration.
+        their configured duration. The check only compares float
+        timestamps, without building datetime or timedelta objects.
         """
-        # Return None if session_id is None
+        # Return None if session_id is None or unknown
         if session_id is None:
             return None
-
-        # Return None if session_id doesn't exist in the dictionary
-        if session_id not in self.user_id_by_session_id:
+        if self.token_signer is not None:
+            return super().user_id_for_session_id(session_id)
+        record = self.user_id_by_session_id.get(session_id)
+        if type(record) is not SessionRecord:
             return None
 
-        # Get the session dictionary
-        session_dict = self.user_id_by_session_id[session_id]
-
         # Return user_id if session_duration is 0 or negative (no expiration)
         if self.session_duration <= 0:
-            return session_dict.get('user_id')
-
-        # Return None if session dictionary doesn't contain created_at
-        if 'created_at' not in session_dict:
+            return record[0]
+
+        # Return None if session has expired, removing the expired ones
+        now = time()
+        if now >= SessionExpAuth._next_sweep:
+            self.sweep_expired_sessions(now)
+        timestamp = record[1]
+        if self.sliding:
+            timestamp = max(timestamp,
+                            self._pending_touches.get(session_id, 0))
+        if timestamp + self.session_duration < now:
             return None
 
-        # Get the creation time
-        created_at = session_dict['created_at']
-
-        # Calculate expiration time
-        expiration_time = created_at + timedelta(seconds=self.session_duration)
-
-        # Return None if session has expired
-        if expiration_time < datetime.now():
-            return None
+        # Sliding sessions are touched once a fraction of their lifetime
+        # has passed since the last touch, not on every request
+        if self.sliding:
+            SessionExpAuth.validated_count += 1
+            if now - timestamp >= self.session_duration * \
+                    self.touch_fraction:
+                self.touch_session(session_id, now)
 
         # Session is still valid, return the user_id
-        return session_dict.get('user_id')
+        return record[0]
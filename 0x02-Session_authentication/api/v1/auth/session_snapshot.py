@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Session snapshot module for the API
+"""
+from api.v1.auth.session_store import SessionRecord, SessionStore
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import accumulate, compress, repeat
+from operator import itemgetter
+from typing import Iterator, List, Tuple
+import gc
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+
+# Magic, version, sessions, users, session IDs size, user IDs size,
+# buckets of the session ID index
+HEADER = struct.Struct('<4sIQQQQQ')
+MAGIC = b'SSNP'
+VERSION = 2
+
+
+def write_snapshot(store: SessionStore, path: str) -> int:
+    """
+    Writes every session of a store to a snapshot file.
+
+    The file holds a header, then one column per field, sessions sorted
+    by timestamp: the timestamps as doubles, the offset of each session
+    ID in the session IDs as uint64, the index of the user ID of each
+    session as uint32 in a deduplicated user table, then an index of the
+    session IDs: the sessions are hashed with CRC32 into a power of two
+    of buckets, the start of each bucket and the sessions of every
+    bucket are stored as uint32. The newline-joined session IDs and user
+    IDs come last. Numbers are in the native byte order, a snapshot is
+    meant to be restored on the same host.
+
+    The snapshot is written next to the target and atomically moved in
+    place, so a crash while writing leaves the previous snapshot intact.
+
+    Args:
+        store (SessionStore): The sessions to save
+        path (str): Path of the snapshot file
+
+    Returns:
+        int: The number of sessions written
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # A session moved while iterating is seen twice, the last record
+        # is the current one
+        sessions = list(dict(store.items()).items())
+        records = list(map(itemgetter(1), sessions))
+        timestamps = list(map(itemgetter(1), records))
+        # Oldest first, so expiring the snapshot is a bisection
+        order = sorted(range(len(sessions)), key=timestamps.__getitem__)
+        sessions = list(map(sessions.__getitem__, order))
+        records = list(map(records.__getitem__, order))
+        timestamps = array('d', map(timestamps.__getitem__, order))
+        # Numbers the user IDs in order of first appearance
+        users = defaultdict()
+        users.default_factory = users.__len__
+        user_indexes = array('I', map(users.__getitem__,
+                                      map(itemgetter(0), records)))
+        session_ids = list(map(str.encode, map(itemgetter(0), sessions)))
+        # Each session ID is followed by a newline
+        offsets = array('Q', accumulate(map((1).__add__,
+                                            map(len, session_ids)),
+                                        initial=0))
+        buckets = 1
+        while buckets < len(sessions):
+            buckets <<= 1
+        mask = buckets - 1
+        bucket_of = list(map(mask.__and__, map(zlib.crc32, session_ids)))
+        rows = array('I', sorted(range(len(sessions)),
+                                 key=bucket_of.__getitem__))
+        counts = [0] * (buckets + 1)
+        for bucket, count in Counter(bucket_of).items():
+            counts[bucket + 1] = count
+        starts = array('I', accumulate(counts))
+        session_blob = b'\n'.join(session_ids)
+        user_blob = '\n'.join(users).encode()
+    finally:
+        if enabled:
+            gc.enable()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sessions), len(users),
+                            len(session_blob), len(user_blob), buckets))
+        for column in (timestamps, offsets, user_indexes, starts, rows):
+            f.write(column.tobytes())
+        f.write(session_blob)
+        f.write(user_blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(sessions)
+
+
+class SnapshotSessions:
+    """
+    Sessions of a snapshot file, read from its memory map.
+
+    Opening a snapshot creates no object per session: a lookup hashes
+    the session ID and compares it with the few sessions of its bucket.
+    The snapshot itself is read-only, removing one of its sessions only
+    marks it as gone. Its sessions are sorted by timestamp, so expiring
+    them moves a cursor found by bisection.
+    """
+
+    def __init__(self, data: mmap.mmap, before: float = None):
+        """
+        Maps the columns of a snapshot.
+
+        Args:
+            data (mmap): The snapshot file, mapped in memory
+            before (float): Sessions with an older timestamp are expired
+
+        Raises:
+            ValueError: If the snapshot is invalid
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("snapshot too short")
+        magic, version, count, users, session_size, user_size, buckets = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or \
+                len(data) != HEADER.size + 24 * count + 8 + \
+                4 * (buckets + 1) + session_size + user_size:
+            raise ValueError("invalid snapshot")
+        self._data = data
+        self._mask = buckets - 1
+        view = memoryview(data)
+        start = HEADER.size
+        columns = []
+        for size, code in ((count, 'd'), (count + 1, 'Q'), (count, 'I'),
+                           (buckets + 1, 'I'), (count, 'I')):
+            end = start + size * struct.calcsize(code)
+            columns.append(view[start:end].cast(code))
+            start = end
+        (self._timestamps, self._offsets, self._user_indexes,
+         self._starts, self._rows) = columns
+        self._session_ids = view[start:start + session_size]
+        # Slicing the map itself compares faster than a memoryview
+        self._base = start
+        start += session_size
+        self._users = str(view[start:start + user_size],
+                          'utf-8').split('\n')
+        self._lock = threading.Lock()
+        self._gone = bytearray(count)
+        self._cursor = 0 if before is None else \
+            bisect_left(self._timestamps, before)
+        self._live = count - self._cursor
+        # User ID -> sessions, built by the first user_sessions()
+        self._user_rows = None
+
+    def _find(self, session_id) -> int:
+        """
+        Index of a session in the columns, -1 if it is not in the file.
+        """
+        if type(session_id) is not str:
+            return -1
+        key = session_id.encode()
+        bucket = zlib.crc32(key) & self._mask
+        data, base, offsets = self._data, self._base, self._offsets
+        for row in self._rows[self._starts[bucket]:self._starts[bucket + 1]]:
+            if data[base + offsets[row]:base + offsets[row + 1] - 1] == key:
+                return row
+        return -1
+
+    def _record(self, row: int) -> SessionRecord:
+        """
+        Record of the session at an index of the columns.
+        """
+        return SessionRecord(self._users[self._user_indexes[row]],
+                             self._timestamps[row])
+
+    def _session_id(self, row: int) -> str:
+        """
+        Session ID at an index of the columns.
+        """
+        return str(self._session_ids[self._offsets[row]:
+                                     self._offsets[row + 1] - 1], 'utf-8')
+
+    def get(self, session_id: str) -> SessionRecord:
+        """
+        Returns the record of a session still in the snapshot.
+
+        Args:
+            session_id (str): The session ID
+
+        Returns:
+            SessionRecord: The record, None if not found or gone
+        """
+        row = self._find(session_id)
+        if row < self._cursor or self._gone[row]:
+            return None
+        return self._record(row)
+
+    def discard(self, session_id: str) -> SessionRecord:
+        """
+        Marks a session of the snapshot as gone.
+
+        Args:
+            session_id (str): The session ID
+
+        Returns:
+            SessionRecord: The record it had, None if not found or gone
+        """
+        row = self._find(session_id)
+        if row < 0:
+            return None
+        with self._lock:
+            if row < self._cursor or self._gone[row]:
+                return None
+            self._gone[row] = 1
+            self._live -= 1
+        return self._record(row)
+
+    def expire(self, before: float) -> List[str]:
+        """
+        Marks the sessions older than a limit as gone.
+
+        Args:
+            before (float): Sessions with an older timestamp are removed
+
+        Returns:
+            List[str]: The session IDs removed
+        """
+        with self._lock:
+            start = self._cursor
+            stop = bisect_left(self._timestamps, before, start)
+            if stop <= start:
+                return []
+            self._cursor = stop
+            rows = list(compress(range(start, stop),
+                                 map((0).__eq__, self._gone[start:stop])))
+            self._live -= len(rows)
+        return list(map(self._session_id, rows))
+
+    def items(self) -> Iterator[Tuple[str, SessionRecord]]:
+        """
+        Iterates over the sessions not gone.
+        """
+        gone = self._gone
+        for row in range(self._cursor, len(gone)):
+            if not gone[row]:
+                yield self._session_id(row), self._record(row)
+
+    def records(self) -> Iterator[Tuple[str, SessionRecord]]:
+        """
+        Decodes every session not expired at once.
+
+        Every column is decoded with a single call, only the filtering
+        of expired sessions and the creation of the records iterate in
+        Python.
+
+        Returns:
+            Iterator: (session ID, SessionRecord) pairs
+        """
+        start = self._cursor
+        timestamps = self._timestamps[start:].tolist()
+        user_ids = map(self._users.__getitem__,
+                       self._user_indexes[start:].tolist())
+        session_ids = str(self._session_ids[self._offsets[start]:],
+                          'utf-8').split('\n') if timestamps else []
+        # tuple.__new__ straight from map, a partial costs one more call
+        records = map(tuple.__new__, repeat(SessionRecord),
+                      zip(user_ids, timestamps))
+        return compress(zip(session_ids, records),
+                        map((0).__eq__, self._gone[start:]))
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Lists the sessions of a user still in the snapshot.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            List[str]: The session IDs of the user
+        """
+        if self._user_rows is None:
+            user_rows = {}
+            for row, user_index in enumerate(self._user_indexes):
+                rows = user_rows.get(user_index)
+                if rows is None:
+                    user_rows[user_index] = [row]
+                else:
+                    rows.append(row)
+            self._user_rows = {self._users[user_index]: rows
+                               for user_index, rows in user_rows.items()}
+        try:
+            rows = self._user_rows.get(user_id, ())
+        except TypeError:
+            return []
+        return [self._session_id(row) for row in rows
+                if row >= self._cursor and not self._gone[row]]
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions not gone.
+        """
+        return self._live
+
+
+def open_snapshot(path: str, before: float = None) -> SnapshotSessions:
+    """
+    Maps a snapshot file in memory.
+
+    Args:
+        path (str): Path of the snapshot file
+        before (float): Sessions with an older timestamp are skipped
+
+    Returns:
+        SnapshotSessions: The sessions, None if the file is missing or
+        invalid
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            return None
+        # The map stays valid once the file is closed or replaced
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return SnapshotSessions(data, before)
+    except ValueError:
+        data.close()
+        return None
+
+
+def read_snapshot(path: str, before: float = None
+                  ) -> Iterator[Tuple[str, SessionRecord]]:
+    """
+    Reads the sessions of a snapshot file.
+
+    Args:
+        path (str): Path of the snapshot file
+        before (float): Sessions with an older timestamp are skipped
+
+    Returns:
+        Iterator: (session ID, SessionRecord) pairs, nothing if the file
+        is missing or invalid
+    """
+    sessions = open_snapshot(path, before)
+    if sessions is None:
+        return iter(())
+    return sessions.records()
+
+
+def restore_snapshot(store: SessionStore, path: str,
+                     before: float = None) -> int:
+    """
+    Restores the sessions of a snapshot file into a store.
+
+    A store able to serve the snapshot from its memory map attaches it
+    and loads nothing, the others load every session.
+
+    Args:
+        store (SessionStore): The store to fill
+        path (str): Path of the snapshot file
+        before (float): Sessions with an older timestamp are skipped
+
+    Returns:
+        int: The number of sessions restored
+    """
+    sessions = open_snapshot(path, before)
+    if sessions is None:
+        return 0
+    attach = getattr(store, 'attach_snapshot', None)
+    if attach is not None and attach(sessions):
+        return len(sessions)
+    # The restored tuples are never garbage, collecting while creating
+    # millions of them only rescans the ones already created
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return store.load(sessions.records())
+    finally:
+        if enabled:
+            gc.enable()
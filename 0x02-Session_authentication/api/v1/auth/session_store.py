@@ -0,0 +1,1382 @@
+#!/usr/bin/env python3
+"""
+Session store module for the API
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from itertools import compress
+from operator import itemgetter
+from os import getenv
+from time import time
+from typing import Dict, Iterable, Iterator, List, Tuple
+import fcntl
+import heapq
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+
+# Compact session record: timestamp is a float epoch
+SessionRecord = namedtuple('SessionRecord', ['user_id', 'created_at'])
+
+
+class SessionStore(ABC):
+    """
+    Interface of the session stores used by SessionAuth and its
+    subclasses. Maps a session ID to a SessionRecord.
+
+    Subclasses implement the abstract get, set, delete, touch, expire,
+    __len__ and items. The dictionary-style methods are built on top of
+    them, so a store can stand in for the former user_id_by_session_id
+    dictionary.
+    """
+
+    # True if a write costs I/O or a cross-process lock, callers then
+    # batch their touches with touch_many()
+    persistent = False
+
+    @abstractmethod
+    def get(self, session_id: str, default=None) -> SessionRecord:
+        """
+        Returns the record of a session.
+
+        Args:
+            session_id (str): The session ID
+            default: Value returned for unknown sessions
+
+        Returns:
+            SessionRecord: The record, or default if not found
+        """
+
+    @abstractmethod
+    def set(self, session_id: str, record: SessionRecord):
+        """
+        Stores the record of a session.
+
+        Args:
+            session_id (str): The session ID
+            record (SessionRecord): The record to store
+
+        Returns:
+            List[str]: The session IDs evicted to make room for it
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session.
+
+        Args:
+            session_id (str): The session ID
+
+        Returns:
+            bool: True if the session existed
+        """
+
+    @abstractmethod
+    def touch(self, session_id: str, timestamp: float = None) -> bool:
+        """
+        Moves the timestamp of a session forward.
+
+        Args:
+            session_id (str): The session ID
+            timestamp (float): New timestamp, defaults to now
+
+        Returns:
+            bool: True if the session exists
+        """
+
+    def touch_many(self, timestamps: dict) -> int:
+        """
+        Moves the timestamps of many sessions forward at once.
+
+        Args:
+            timestamps (dict): Session ID -> new timestamp
+
+        Returns:
+            int: The number of sessions that exist
+        """
+        return sum(self.touch(session_id, timestamp)
+                   for session_id, timestamp in timestamps.items())
+
+    @abstractmethod
+    def expire(self, before: float) -> int:
+        """
+        Removes the sessions whose timestamp is older than a limit.
+
+        Args:
+            before (float): Sessions with an older timestamp are removed
+
+        Returns:
+            List[str]: The session IDs removed
+        """
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, SessionRecord]]:
+        """
+        Iterates over the (session ID, record) pairs.
+        """
+
+    def load(self, sessions: Iterable[Tuple[str, SessionRecord]]) -> int:
+        """
+        Stores many sessions at once, e.g. when restoring a snapshot.
+
+        Args:
+            sessions (Iterable): (session ID, record) pairs
+
+        Returns:
+            int: The number of sessions stored
+        """
+        count = 0
+        for session_id, record in sessions:
+            self.set(session_id, record)
+            count += 1
+        return count
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Lists the sessions of a user.
+
+        This default implementation scans every session, stores with a
+        user ID index override it.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            List[str]: The session IDs of the user
+        """
+        return [session_id for session_id, record in self.items()
+                if record[0] == user_id]
+
+    def delete_user(self, user_id: str) -> List[str]:
+        """
+        Removes every session of a user.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            List[str]: The session IDs removed
+        """
+        return [session_id for session_id in self.user_sessions(user_id)
+                if self.delete(session_id)]
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions.
+        """
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        Tells if a session exists.
+        """
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> SessionRecord:
+        """
+        Returns the record of a session.
+
+        Raises:
+            KeyError: If the session does not exist
+        """
+        record = self.get(session_id)
+        if record is None:
+            raise KeyError(session_id)
+        return record
+
+    def __setitem__(self, session_id: str, record: SessionRecord):
+        """
+        Stores the record of a session.
+        """
+        self.set(session_id, record)
+
+    def __delitem__(self, session_id: str):
+        """
+        Removes a session.
+
+        Raises:
+            KeyError: If the session does not exist
+        """
+        if not self.delete(session_id):
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterates over the session IDs.
+        """
+        return (session_id for session_id, _ in self.items())
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Session store in a dictionary of the current process.
+
+    Sessions are kept in least-recently-used order: get() and set() move
+    a session to the end. When max_sessions is reached, the least
+    recently used session is evicted, and when a user reaches
+    max_per_user sessions, that user's oldest session is evicted. A
+    user ID -> session IDs index makes both decisions O(1). After a bulk
+    load() the index is only built by the first lookup of the sessions
+    of a user, restoring a snapshot does not pay for it.
+
+    Expiration uses a min-heap of (timestamp, session ID): expire() only
+    pops the entries older than the limit, so it costs O(expired).
+    Entries of sessions that were deleted or touched since are skipped.
+
+    The store does no locking, ShardedSessionStore wraps it for threads.
+    """
+
+    def __init__(self, max_sessions: int = 0, max_per_user: int = 0):
+        """
+        Initialize an empty MemorySessionStore.
+
+        Args:
+            max_sessions (int): Maximum number of sessions, 0 for no limit
+            max_per_user (int): Maximum number of sessions of one user, 0
+            for no limit
+        """
+        self.max_sessions = max_sessions
+        self.max_per_user = max_per_user
+        self.evictions = 0
+        # Only the LRU order of a bounded store needs an OrderedDict
+        self._sessions = OrderedDict() if max_sessions > 0 else {}
+        # User ID -> session IDs, None until built after a bulk load
+        self._by_user = {}
+        self._heap = []
+
+    def get(self, session_id, default=None):
+        """
+        Returns the record of a session, moving it to the end of the
+        least-recently-used order of a bounded store.
+        """
+        try:
+            record = self._sessions.get(session_id)
+        except TypeError:
+            return default
+        if record is None:
+            return default
+        if self.max_sessions > 0:
+            try:
+                self._sessions.move_to_end(session_id)
+            except KeyError:
+                # Deleted by another thread in the meantime
+                pass
+        return record
+
+    def set(self, session_id, record):
+        """
+        Stores the record of a session, evicting the oldest session of
+        its user and the least recently used sessions first if a limit is
+        reached.
+        """
+        return [evicted_id for evicted_id, _ in self._set(session_id, record)]
+
+    def _set(self, session_id: str,
+             record: SessionRecord) -> List[Tuple[str, SessionRecord]]:
+        """
+        Stores the record of a session like set().
+
+        Returns:
+            List: (session ID, record) of the sessions evicted
+        """
+        sessions = self._sessions
+        previous = sessions.pop(session_id, None)
+        if previous is not None:
+            self._unlink(session_id, previous[0])
+        evicted = []
+        by_user = self._by_user
+        if by_user is not None:
+            user_sessions = by_user.get(record[0])
+            if user_sessions is not None and \
+                    0 < self.max_per_user <= len(user_sessions):
+                evicted.append(self._evict(next(iter(user_sessions))))
+        while 0 < self.max_sessions <= len(sessions):
+            evicted.append(self._evict(next(iter(sessions))))
+        sessions[session_id] = record
+        if by_user is not None:
+            # Looked up again: evicting the last session of the user
+            # drops its entry from the index
+            user_sessions = by_user.get(record[0])
+            if user_sessions is None:
+                user_sessions = by_user[record[0]] = {}
+            user_sessions[session_id] = None
+        heapq.heappush(self._heap, (record[1], session_id))
+        if len(self._heap) > 2 * len(sessions) + 1024:
+            self._rebuild_heap()
+        return evicted
+
+    def _evict(self, session_id: str) -> Tuple[str, SessionRecord]:
+        """
+        Removes a session to make room for a new one.
+
+        Returns:
+            Tuple: The session ID and its record, None if it was missing
+        """
+        record = self._pop(session_id)
+        if record is not None:
+            self.evictions += 1
+        return session_id, record
+
+    def _unlink(self, session_id: str, user_id: str):
+        """
+        Removes a session from the user ID -> session IDs index.
+        """
+        if self._by_user is None:
+            return
+        user_sessions = self._by_user.get(user_id)
+        if user_sessions is None:
+            return
+        user_sessions.pop(session_id, None)
+        if not user_sessions:
+            del self._by_user[user_id]
+
+    def _users(self) -> Dict[str, Dict[str, None]]:
+        """
+        Returns the user ID -> session IDs index, building it first if a
+        bulk load skipped it.
+        """
+        if self._by_user is None:
+            by_user = {}
+            for session_id, record in self._sessions.items():
+                user_sessions = by_user.get(record[0])
+                if user_sessions is None:
+                    by_user[record[0]] = {session_id: None}
+                else:
+                    user_sessions[session_id] = None
+            self._by_user = by_user
+        return self._by_user
+
+    def _rebuild_heap(self):
+        """
+        Drops the heap entries of sessions deleted or touched since.
+        """
+        self._heap = [(record[1], session_id)
+                      for session_id, record in self._sessions.items()]
+        heapq.heapify(self._heap)
+
+    def delete(self, session_id):
+        """
+        Removes a session and unlinks it from its user.
+        """
+        return self._pop(session_id) is not None
+
+    def _pop(self, session_id: str) -> SessionRecord:
+        """
+        Removes a session and unlinks it from its user.
+
+        Returns:
+            SessionRecord: The record of the session, None if not found
+        """
+        try:
+            record = self._sessions.pop(session_id, None)
+        except TypeError:
+            return None
+        if record is not None:
+            self._unlink(session_id, record[0])
+        return record
+
+    def touch(self, session_id, timestamp=None):
+        """
+        Moves the timestamp of a session forward.
+        """
+        record = self._sessions.get(session_id)
+        if record is None:
+            return False
+        self.set(session_id, SessionRecord(
+            record[0], time() if timestamp is None else timestamp))
+        return True
+
+    def expire(self, before):
+        """
+        Pops the heap entries older than the limit, removing the
+        sessions they still match.
+        """
+        return [session_id for session_id, _ in self._expire(before)]
+
+    def _expire(self, before: float) -> List[Tuple[str, SessionRecord]]:
+        """
+        Removes the sessions older than a limit like expire().
+
+        Returns:
+            List: (session ID, record) of the sessions removed
+        """
+        heap = self._heap
+        sessions = self._sessions
+        removed = []
+        while heap and heap[0][0] < before:
+            timestamp, session_id = heapq.heappop(heap)
+            record = sessions.get(session_id)
+            if record is None or record[1] != timestamp:
+                continue
+            del sessions[session_id]
+            self._unlink(session_id, record[0])
+            removed.append((session_id, record))
+        return removed
+
+    def items(self):
+        """
+        Iterates over a copy of the (session ID, record) pairs.
+        """
+        return iter(list(self._sessions.items()))
+
+    def load(self, sessions):
+        """
+        Stores many sessions at once, building the dictionaries and the
+        heap in one pass when the store is empty and unbounded.
+        """
+        if self.max_sessions > 0 or self.max_per_user > 0 or \
+                self._sessions:
+            return super().load(sessions)
+        # Bulk build of an empty store: no eviction to check, the heap is
+        # built once and the user index when first needed
+        sessions = self._sessions = dict(sessions)
+        self._by_user = None
+        self._heap = list(zip(map(itemgetter(1), sessions.values()),
+                              sessions))
+        heapq.heapify(self._heap)
+        return len(sessions)
+
+    def user_sessions(self, user_id):
+        """
+        Lists the sessions of a user from the user ID index.
+        """
+        try:
+            return list(self._users().get(user_id, ()))
+        except TypeError:
+            return []
+
+    def __len__(self):
+        """
+        Returns the number of sessions.
+        """
+        return len(self._sessions)
+
+
+def default_shard_count() -> int:
+    """
+    Number of shards of a ShardedSessionStore when none is configured.
+
+    With the GIL, threads never run the store code in parallel: 1 and 16
+    shards give the same throughput under 32 threads (main_9), so the
+    store is not split. Free-threaded builds get one shard per CPU.
+
+    Returns:
+        int: The number of shards
+    """
+    if getattr(sys, '_is_gil_enabled', lambda: True)():
+        return 1
+    return os.cpu_count() or 1
+
+
+class ShardedSessionStore(SessionStore):
+    """
+    Thread-safe session store split into MemorySessionStore shards.
+
+    A session lives in the shard picked by the hash of its ID and every
+    shard has its own lock, so threads working on different sessions
+    rarely wait for each other and no operation holds a global lock.
+    Lookups take no lock at all unless max_sessions is set.
+    max_sessions is split evenly between the shards, which makes the
+    least-recently-used eviction approximate.
+
+    When max_per_user is set, a user ID -> session IDs index spanning
+    the shards keeps the sessions of each user, oldest first. Its entry
+    of a user is guarded by one of as many user locks, picked by the
+    hash of the user ID. set() evicts the user's oldest sessions from it
+    in O(max_per_user) instead of searching every shard. Locks are
+    always taken user lock first, then one shard lock at a time, so
+    they cannot deadlock. Sessions removed by a shard are unlinked
+    from the index after its lock is released.
+
+    Without limits, a store can serve the sessions of a snapshot from
+    its memory map (see attach_snapshot()). A session is looked up in
+    its shard first, then in the snapshot, and moves to its shard the
+    first time it is read, set or touched.
+    """
+
+    def __init__(self, shards: int = None, max_sessions: int = 0,
+                 max_per_user: int = 0):
+        """
+        Initialize an empty ShardedSessionStore.
+
+        Args:
+            shards (int): Number of shards, rounded up to a power of two,
+            default_shard_count() if None
+            max_sessions (int): Maximum number of sessions, 0 for no limit
+            max_per_user (int): Maximum number of sessions of one user, 0
+            for no limit
+        """
+        if shards is None:
+            shards = default_shard_count()
+        count = 1
+        while count < shards:
+            count <<= 1
+        self._mask = count - 1
+        self.max_per_user = max_per_user
+        per_shard = -(-max_sessions // count) if max_sessions > 0 else 0
+        self._shards = [MemorySessionStore(per_shard) for _ in range(count)]
+        self._locks = [threading.Lock() for _ in range(count)]
+        self._user_locks = [threading.Lock() for _ in range(count)]
+        # User ID -> session IDs, oldest first, when max_per_user is set
+        self._by_user = {}
+        # Sessions not loaded yet, see attach_snapshot()
+        self._snapshot = None
+
+    def _index(self, session_id) -> int:
+        """
+        Shard of a session ID, -1 if it cannot be a key.
+        """
+        try:
+            return hash(session_id) & self._mask
+        except TypeError:
+            return -1
+
+    @property
+    def evictions(self) -> int:
+        """
+        Number of sessions evicted by every shard.
+        """
+        return sum(shard.evictions for shard in self._shards)
+
+    def get(self, session_id, default=None):
+        """
+        Returns the record of a session from its shard.
+        """
+        index = self._index(session_id)
+        if index < 0:
+            return default
+        shard = self._shards[index]
+        if shard.max_sessions <= 0:
+            # Read first: once the snapshot is detached, every session it
+            # still had is in its shard
+            snapshot = self._snapshot
+            # A single dict lookup is atomic and records are immutable,
+            # so reads only lock to update the LRU order
+            record = shard._sessions.get(session_id)
+            if record is None and snapshot is not None:
+                # Locked, a session being moved to its shard is found
+                with self._locks[index]:
+                    record = shard._sessions.get(session_id) or \
+                        self._promote(snapshot, index, session_id)
+            return default if record is None else record
+        with self._locks[index]:
+            return shard.get(session_id, default)
+
+    def set(self, session_id, record):
+        """
+        Stores the record of a session in its shard. When the sessions
+        per user are limited, the user's oldest sessions are evicted
+        first, under the lock of the user.
+        """
+        index = self._index(session_id)
+        if self.max_per_user <= 0:
+            with self._locks[index]:
+                evicted = self._shards[index].set(session_id, record)
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot.discard(session_id)
+            return evicted
+        user_id = record[0]
+        evicted = []
+        with self._user_lock(user_id):
+            owned = self._by_user.get(user_id)
+            if owned is None:
+                owned = self._by_user[user_id] = {}
+            owned.pop(session_id, None)
+            if len(owned) >= self.max_per_user:
+                self._drop_stale(user_id, owned)
+            while len(owned) >= self.max_per_user:
+                oldest = next(iter(owned))
+                del owned[oldest]
+                shard = self._index(oldest)
+                with self._locks[shard]:
+                    if self._shards[shard]._evict(oldest)[1] is not None:
+                        evicted.append(oldest)
+            with self._locks[index]:
+                shard_evicted = self._shards[index]._set(session_id, record)
+            owned[session_id] = None
+        # Sessions of any user may have been evicted by the shard limit
+        self._forget(shard_evicted)
+        return evicted + [evicted_id for evicted_id, _ in shard_evicted]
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        """
+        Lock guarding the index entry of a user.
+        """
+        return self._user_locks[hash(user_id) & self._mask]
+
+    def _drop_stale(self, user_id: str, owned: dict):
+        """
+        Drops from the index entry of a user, its lock being held, the
+        sessions removed by another thread that has not unlinked them
+        yet. Costs O(max_per_user).
+        """
+        for session_id in list(owned):
+            shard = self._shards[self._index(session_id)]
+            record = shard._sessions.get(session_id)
+            if record is None or record[0] != user_id:
+                del owned[session_id]
+
+    def _forget(self, removed: List[Tuple[str, SessionRecord]]):
+        """
+        Unlinks sessions removed from their shard from the user index,
+        taking the lock of one user at a time.
+        """
+        if self.max_per_user <= 0:
+            return
+        for session_id, record in removed:
+            if record is None:
+                continue
+            with self._user_lock(record[0]):
+                owned = self._by_user.get(record[0])
+                if owned is None:
+                    continue
+                owned.pop(session_id, None)
+                if not owned:
+                    del self._by_user[record[0]]
+
+    def _user_records(self, user_id: str) -> List[Tuple[str, float]]:
+        """
+        (session ID, timestamp) of every session of a user.
+        """
+        result = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                for session_id in shard.user_sessions(user_id):
+                    result.append((session_id,
+                                   shard._sessions[session_id][1]))
+        return result
+
+    def delete(self, session_id):
+        """
+        Removes a session from its shard.
+        """
+        index = self._index(session_id)
+        if index < 0:
+            return False
+        snapshot = self._snapshot
+        found = snapshot is not None and \
+            snapshot.discard(session_id) is not None
+        with self._locks[index]:
+            record = self._shards[index]._pop(session_id)
+        if record is None:
+            return found
+        self._forget([(session_id, record)])
+        return True
+
+    def touch(self, session_id, timestamp=None):
+        """
+        Moves the timestamp of a session forward in its shard, making it
+        the most recent session of its user.
+        """
+        index = self._index(session_id)
+        if index < 0:
+            return False
+        if self.max_per_user <= 0:
+            with self._locks[index]:
+                return self._shards[index].touch(session_id, timestamp) \
+                    or self._promote(self._snapshot, index, session_id,
+                                     time() if timestamp is None
+                                     else timestamp) is not None
+        record = self.get(session_id)
+        if record is None:
+            return False
+        with self._user_lock(record[0]):
+            with self._locks[index]:
+                touched = self._shards[index].touch(session_id, timestamp)
+            owned = self._by_user.get(record[0])
+            if touched and owned is not None and session_id in owned:
+                del owned[session_id]
+                owned[session_id] = None
+        return touched
+
+    def expire(self, before):
+        """
+        Expires the old sessions of each shard, one shard lock at a
+        time.
+        """
+        removed = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                removed += shard._expire(before)
+        self._forget(removed)
+        expired = [session_id for session_id, _ in removed]
+        snapshot = self._snapshot
+        if snapshot is not None:
+            expired += snapshot.expire(before)
+            if not snapshot:
+                # Detached once no session is being moved to its shard
+                for lock in self._locks:
+                    lock.acquire()
+                if self._snapshot is snapshot:
+                    self._snapshot = None
+                for lock in self._locks:
+                    lock.release()
+        return expired
+
+    def items(self):
+        """
+        Iterates over the sessions, copying one shard at a time under
+        its lock, after the sessions still in the snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            yield from snapshot.items()
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard_items = list(shard._sessions.items())
+            yield from shard_items
+
+    def load(self, sessions):
+        """
+        Stores many sessions at once, split by shard first so each
+        shard is built in one pass.
+        """
+        if self.max_per_user > 0:
+            return super().load(sessions)
+        buckets = [{} for _ in self._shards]
+        setters = [bucket.__setitem__ for bucket in buckets]
+        mask = self._mask
+        for session_id, record in sessions:
+            setters[hash(session_id) & mask](session_id, record)
+        count = 0
+        for shard, lock, bucket in zip(self._shards, self._locks, buckets):
+            with lock:
+                count += shard.load(bucket)
+        snapshot = self._snapshot
+        if snapshot is not None:
+            for bucket in buckets:
+                for session_id in bucket:
+                    snapshot.discard(session_id)
+        return count
+
+    def _promote(self, snapshot, index: int, session_id: str,
+                 timestamp: float = None) -> SessionRecord:
+        """
+        Moves a session from a snapshot to its shard, whose lock is
+        held.
+
+        Returns:
+            SessionRecord: The record stored, None if not in the snapshot
+        """
+        record = None if snapshot is None else snapshot.discard(session_id)
+        if record is None:
+            return None
+        if timestamp is not None:
+            record = SessionRecord(record[0], timestamp)
+        self._shards[index]._set(session_id, record)
+        return record
+
+    def attach_snapshot(self, snapshot) -> bool:
+        """
+        Serves the sessions of a snapshot without loading them.
+
+        Only an empty store without limits attaches a snapshot: evicting
+        the least recently used sessions or the oldest sessions of a
+        user needs every session in the shards.
+
+        Args:
+            snapshot (SnapshotSessions): The sessions of a snapshot file
+
+        Returns:
+            bool: Whether the snapshot is attached
+        """
+        if self.max_per_user > 0 or self._shards[0].max_sessions > 0 or \
+                self._snapshot is not None or len(self):
+            return False
+        self._snapshot = snapshot
+        return True
+
+    def user_sessions(self, user_id):
+        """
+        Lists the sessions of a user, from the user index when the
+        sessions per user are limited, otherwise from every shard.
+        """
+        if self.max_per_user <= 0:
+            snapshot = self._snapshot
+            restored = [] if snapshot is None else \
+                snapshot.user_sessions(user_id)
+            return restored + [session_id for session_id, _ in
+                               self._user_records(user_id)]
+        try:
+            lock = self._user_lock(user_id)
+        except TypeError:
+            return []
+        with lock:
+            owned = self._by_user.get(user_id)
+            if owned is None:
+                return []
+            self._drop_stale(user_id, owned)
+            return list(owned)
+
+    def delete_user(self, user_id):
+        """
+        Removes every session of a user, from the user index when the
+        sessions per user are limited.
+        """
+        if self.max_per_user <= 0:
+            return super().delete_user(user_id)
+        try:
+            lock = self._user_lock(user_id)
+        except TypeError:
+            return []
+        removed = []
+        with lock:
+            for session_id in self._by_user.pop(user_id, None) or ():
+                index = self._index(session_id)
+                with self._locks[index]:
+                    record = self._shards[index]._pop(session_id)
+                if record is not None:
+                    removed.append(session_id)
+        return removed
+
+    def __len__(self):
+        """
+        Returns the number of sessions of every shard and of the
+        snapshot.
+        """
+        snapshot = self._snapshot
+        return sum(len(shard) for shard in self._shards) + \
+            (0 if snapshot is None else len(snapshot))
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in an SQLite database file, shared by every process
+    opening the same file. Each thread uses its own connection, in WAL
+    mode so readers never wait for writers.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str = 'sessions.db'):
+        """
+        Initialize a SQLiteSessionStore.
+
+        Args:
+            path (str): Path of the database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_created_at"
+            " ON sessions (created_at);"
+            "CREATE INDEX IF NOT EXISTS sessions_user_id"
+            " ON sessions (user_id);")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id, default=None):
+        """
+        Returns the record of a session from the database.
+        """
+        if not isinstance(session_id, str):
+            return default
+        row = self._connection().execute(
+            "SELECT user_id, created_at FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        return SessionRecord(*row) if row is not None else default
+
+    def set(self, session_id, record):
+        """
+        Inserts or replaces the row of a session.
+        """
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session_id, record[0], record[1]))
+        return []
+
+    def delete(self, session_id):
+        """
+        Deletes the row of a session.
+        """
+        return self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?",
+            (session_id,)).rowcount > 0
+
+    def touch(self, session_id, timestamp=None):
+        """
+        Updates the timestamp of a session.
+        """
+        return self._connection().execute(
+            "UPDATE sessions SET created_at = ? WHERE session_id = ?",
+            (time() if timestamp is None else timestamp,
+             session_id)).rowcount > 0
+
+    def touch_many(self, timestamps):
+        """
+        Updates the timestamps of many sessions in one transaction.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN")
+        try:
+            touched = connection.executemany(
+                "UPDATE sessions SET created_at = ? WHERE session_id = ?",
+                ((timestamp, session_id) for session_id, timestamp
+                 in timestamps.items())).rowcount
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return touched
+
+    def expire(self, before):
+        """
+        Deletes the rows older than the limit, using the created_at
+        index.
+        """
+        connection = self._connection()
+        # Listed and deleted in one write transaction, so no other process
+        # removes or touches them in between
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            removed = [row[0] for row in connection.execute(
+                "SELECT session_id FROM sessions WHERE created_at < ?",
+                (before,))]
+            connection.execute(
+                "DELETE FROM sessions WHERE created_at < ?", (before,))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return removed
+
+    def items(self):
+        """
+        Iterates over the rows of the sessions table.
+        """
+        rows = self._connection().execute(
+            "SELECT session_id, user_id, created_at FROM sessions")
+        return ((row[0], SessionRecord(row[1], row[2])) for row in rows)
+
+    def user_sessions(self, user_id):
+        """
+        Lists the sessions of a user, using the user_id index.
+        """
+        return [row[0] for row in self._connection().execute(
+            "SELECT session_id FROM sessions WHERE user_id = ?", (user_id,))]
+
+    def __len__(self):
+        """
+        Returns the number of rows.
+        """
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SharedMemorySessionStore(SessionStore):
+    """
+    Session store in a fixed-size hash table in shared memory, shared by
+    every process of the host that opens the same name.
+
+    The table uses open addressing with linear probing over slots of
+    [state, session ID, user ID, timestamp]. The hash is CRC32, which
+    unlike hash() is the same in every process. Writers take an flock on
+    a lock file next to the segment, so updates are atomic across
+    processes. There is no user ID index: listing the sessions of a user
+    scans the whole table.
+
+    There is no expiration index either: expire() scans the next
+    EXPIRE_CHUNK slots from a cursor shared by every process, and only
+    takes the lock to remove the expired sessions found. A sweep costs
+    O(EXPIRE_CHUNK) whatever the capacity, and an expired session is
+    reclaimed within capacity / EXPIRE_CHUNK sweeps. Lookups check the
+    timestamps anyway, so a late reclaim only holds the slot longer.
+
+    Lookups probe without the lock. Rebuilding the table moves every
+    slot, so it makes the generation in the header odd while it runs
+    and even again after: a lookup that sees the generation odd or
+    changed probes again under the lock.
+    """
+
+    persistent = True
+
+    # Slot states
+    EMPTY, USED, DELETED = 0, 1, 2
+
+    # state, session ID, user ID, timestamp
+    SLOT = struct.Struct('B64s64sd')
+
+    # Number of used slots, number of deleted slots
+    COUNTS = struct.Struct('QQ')
+
+    # Counts, the next slot expire() scans, then the generation
+    HEADER = struct.Struct('QQQQ')
+
+    # Generation of the table, at the end of the header
+    GENERATION = struct.Struct('Q')
+    GENERATION_OFFSET = HEADER.size - GENERATION.size
+
+    # Timestamp of a slot, and its index in a slot read as doubles
+    TIMESTAMP = struct.Struct('d')
+    TIMESTAMP_INDEX = SLOT.size // 8 - 1
+
+    # Number of slots scanned by one expire() call
+    EXPIRE_CHUNK = 1 << 16
+
+    def __init__(self, name: str = 'session_store',
+                 capacity: int = 1 << 20):
+        """
+        Creates or attaches to a SharedMemorySessionStore.
+
+        Args:
+            name (str): Name of the shared memory segment
+            capacity (int): Number of slots, the table holds at most
+            three quarters of it
+        """
+        from multiprocessing import resource_tracker, shared_memory
+
+        self.capacity = capacity
+        size = self.HEADER.size + capacity * self.SLOT.size
+        self._lock_file = open(os.path.join(
+            getenv('TMPDIR', '/tmp'), '{}.lock'.format(name)), 'a')
+        with self._locked():
+            try:
+                self._shm = shared_memory.SharedMemory(name, create=True,
+                                                       size=size)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name)
+        # The segment outlives this process, other workers still use it
+        resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+
+    @contextmanager
+    def _locked(self):
+        """
+        Context manager holding the cross-process lock.
+        """
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _slot_offset(self, index: int) -> int:
+        """
+        Byte offset of a slot in the segment.
+        """
+        return self.HEADER.size + index * self.SLOT.size
+
+    def _find(self, key: bytes) -> Tuple[int, int]:
+        """
+        Probes the table for a key.
+
+        Returns:
+            (slot holding the key or -1, first free slot or -1)
+        """
+        free = -1
+        index = zlib.crc32(key) % self.capacity
+        for _ in range(self.capacity):
+            state, slot_key, _, _ = self.SLOT.unpack_from(
+                self._buf, self._slot_offset(index))
+            if state == self.EMPTY:
+                return -1, index if free < 0 else free
+            if state == self.DELETED:
+                if free < 0:
+                    free = index
+            elif slot_key.rstrip(b'\0') == key:
+                return index, free
+            index = (index + 1) % self.capacity
+        return -1, free
+
+    @staticmethod
+    def _encode(value: str) -> bytes:
+        """
+        Encodes a session or user ID for a slot.
+
+        Raises:
+            ValueError: If it does not fit in 64 bytes
+        """
+        encoded = value.encode()
+        if len(encoded) > 64:
+            raise ValueError("value longer than 64 bytes")
+        return encoded
+
+    def _counts(self) -> Tuple[int, int]:
+        """
+        Returns the number of used and deleted slots.
+        """
+        return self.COUNTS.unpack_from(self._buf, 0)
+
+    def _generation(self) -> int:
+        """
+        Returns the generation of the table, odd during a rebuild.
+        """
+        return self.GENERATION.unpack_from(self._buf,
+                                           self.GENERATION_OFFSET)[0]
+
+    def get(self, session_id, default=None):
+        """
+        Returns the record of a session, probing without the lock unless
+        the table is rebuilt meanwhile.
+        """
+        if not isinstance(session_id, str):
+            return default
+        try:
+            key = self._encode(session_id)
+        except ValueError:
+            # Too long to have been stored
+            return default
+        generation = self._generation()
+        if not generation & 1:
+            record = self._get(key)
+            if self._generation() == generation:
+                return default if record is None else record
+        # The slots moved while probing
+        with self._locked():
+            record = self._get(key)
+        return default if record is None else record
+
+    def _get(self, key: bytes) -> SessionRecord:
+        """
+        Probes the table for the record of a key.
+
+        Returns:
+            SessionRecord: The record, None if not found
+        """
+        index, _ = self._find(key)
+        if index < 0:
+            return None
+        state, slot_key, user_id, timestamp = self.SLOT.unpack_from(
+            self._buf, self._slot_offset(index))
+        if state != self.USED or slot_key.rstrip(b'\0') != key:
+            # Changed by another process while reading
+            return None
+        return SessionRecord(user_id.rstrip(b'\0').decode(), timestamp)
+
+    def set(self, session_id, record):
+        """
+        Writes the slot of a session under the lock, rebuilding the
+        table first if deleted slots fill it.
+
+        Raises:
+            ValueError: If an ID does not fit in 64 bytes
+            MemoryError: If the table is full
+        """
+        key = self._encode(session_id)
+        value = self._encode(record[0])
+        with self._locked():
+            used, deleted = self._counts()
+            if (used + deleted + 1) * 4 > self.capacity * 3 and deleted:
+                self._rebuild_locked()
+                used, deleted = self._counts()
+            index, free = self._find(key)
+            if index < 0:
+                if free < 0 or (used + 1) * 4 > self.capacity * 3:
+                    raise MemoryError("shared session store is full")
+                index = free
+                state = self.SLOT.unpack_from(
+                    self._buf, self._slot_offset(index))[0]
+                if state == self.DELETED:
+                    deleted -= 1
+                used += 1
+            self.SLOT.pack_into(self._buf, self._slot_offset(index),
+                                self.USED, key, value, record[1])
+            self.COUNTS.pack_into(self._buf, 0, used, deleted)
+        return []
+
+    def _rebuild_locked(self):
+        """
+        Reinserts every live slot into a cleared table, dropping the
+        deleted slots that lengthen the probe sequences.
+        """
+        live = [(key, user_id, timestamp)
+                for key, (user_id, timestamp) in self.items()]
+        generation = self._generation() + 1
+        self.GENERATION.pack_into(self._buf, self.GENERATION_OFFSET,
+                                  generation)
+        end = self._slot_offset(self.capacity)
+        self._buf[self.HEADER.size:end] = bytes(end - self.HEADER.size)
+        for key, user_id, timestamp in live:
+            _, free = self._find(key.encode())
+            self.SLOT.pack_into(self._buf, self._slot_offset(free),
+                                self.USED, key.encode(), user_id.encode(),
+                                timestamp)
+        self.COUNTS.pack_into(self._buf, 0, len(live), 0)
+        self.GENERATION.pack_into(self._buf, self.GENERATION_OFFSET,
+                                  generation + 1)
+
+    def delete(self, session_id):
+        """
+        Marks the slot of a session as deleted.
+        """
+        if not isinstance(session_id, str):
+            return False
+        try:
+            key = self._encode(session_id)
+        except ValueError:
+            return False
+        with self._locked():
+            return self._delete_locked(key)
+
+    def _delete_locked(self, key: bytes) -> bool:
+        """
+        Marks the slot of a key as deleted, the lock being held.
+        """
+        index, _ = self._find(key)
+        if index < 0:
+            return False
+        used, deleted = self._counts()
+        self._buf[self._slot_offset(index)] = self.DELETED
+        self.COUNTS.pack_into(self._buf, 0, used - 1, deleted + 1)
+        return True
+
+    def touch(self, session_id, timestamp=None):
+        """
+        Moves the timestamp of a session forward, checking under the lock
+        that it still exists so a deleted session is not written back.
+        """
+        return self.touch_many({session_id: time() if timestamp is None
+                                else timestamp}) > 0
+
+    def touch_many(self, timestamps):
+        """
+        Moves the timestamps of many sessions forward under one lock,
+        only writing the slots still used.
+        """
+        keys = []
+        for session_id, timestamp in timestamps.items():
+            if not isinstance(session_id, str):
+                continue
+            try:
+                keys.append((self._encode(session_id), timestamp))
+            except ValueError:
+                continue
+        touched = 0
+        with self._locked():
+            for key, timestamp in keys:
+                index, _ = self._find(key)
+                if index < 0:
+                    continue
+                offset = self._slot_offset(index)
+                if self._buf[offset] != self.USED:
+                    continue
+                self.TIMESTAMP.pack_into(
+                    self._buf, offset + 8 * self.TIMESTAMP_INDEX, timestamp)
+                touched += 1
+        return touched
+
+    def expire(self, before):
+        """
+        Removes the expired sessions of the next chunk of slots.
+        """
+        start = self.HEADER.unpack_from(self._buf, 0)[2] % self.capacity
+        stop = min(start + self.EXPIRE_CHUNK, self.capacity)
+        # Read without the lock, the state byte and timestamp of every
+        # slot of the chunk at once
+        chunk = self._buf[self._slot_offset(start):self._slot_offset(stop)]
+        states = bytes(chunk[::self.SLOT.size])
+        timestamps = chunk.cast('d')[self.TIMESTAMP_INDEX::
+                                     self.SLOT.size // 8].tolist()
+        occupied = compress(range(len(states)), states)
+        candidates = [index for index in occupied
+                      if states[index] == self.USED and
+                      timestamps[index] < before]
+        chunk.release()
+        removed = []
+        with self._locked():
+            used, deleted, _, generation = self.HEADER.unpack_from(
+                self._buf, 0)
+            for index in candidates:
+                offset = self._slot_offset(start + index)
+                state, key, _, timestamp = self.SLOT.unpack_from(
+                    self._buf, offset)
+                # Checked again, it may have changed since it was read
+                if state == self.USED and timestamp < before:
+                    self._buf[offset] = self.DELETED
+                    removed.append(key.rstrip(b'\0').decode())
+            self.HEADER.pack_into(self._buf, 0, used - len(removed),
+                                  deleted + len(removed),
+                                  stop % self.capacity, generation)
+        return removed
+
+    def items(self):
+        """
+        Iterates over the used slots.
+        """
+        for index in range(self.capacity):
+            state, key, user_id, timestamp = self.SLOT.unpack_from(
+                self._buf, self._slot_offset(index))
+            if state == self.USED:
+                yield (key.rstrip(b'\0').decode(),
+                       SessionRecord(user_id.rstrip(b'\0').decode(),
+                                     timestamp))
+
+    def __len__(self):
+        """
+        Returns the number of used slots.
+        """
+        return self._counts()[0]
+
+    def close(self, unlink: bool = False):
+        """
+        Detaches from the shared memory segment.
+
+        Args:
+            unlink (bool): Also destroy the segment for every process
+        """
+        from multiprocessing import resource_tracker
+
+        self._buf = None
+        self._shm.close()
+        if unlink:
+            # unlink() unregisters the segment from the resource tracker
+            resource_tracker.register(self._shm._name, 'shared_memory')
+            self._shm.unlink()
+
+
+def session_store_from_env() -> SessionStore:
+    """
+    Builds the session store selected by the SESSION_STORE environment
+    variable: "memory" (default), "sqlite" or "shm".
+
+    The memory store is split into SESSION_STORE_SHARDS (default
+    default_shard_count()) independently locked shards so it can be
+    shared by threads.
+    SESSION_STORE_MAX and SESSION_MAX_PER_USER bound the memory store,
+    SESSION_STORE_PATH sets the SQLite database file (default
+    sessions.db), SESSION_STORE_NAME and SESSION_STORE_CAPACITY the name
+    and number of slots of the shared memory table.
+
+    Returns:
+        SessionStore: The session store
+    """
+    backend = getenv('SESSION_STORE', 'memory')
+    if backend == 'sqlite':
+        return SQLiteSessionStore(getenv('SESSION_STORE_PATH',
+                                         'sessions.db'))
+    if backend == 'shm':
+        try:
+            capacity = int(getenv('SESSION_STORE_CAPACITY'))
+        except (TypeError, ValueError):
+            capacity = 1 << 20
+        return SharedMemorySessionStore(
+            getenv('SESSION_STORE_NAME', 'session_store'), capacity)
+    limits = []
+    for name in ('SESSION_STORE_SHARDS', 'SESSION_STORE_MAX',
+                 'SESSION_MAX_PER_USER'):
+        try:
+            limits.append(int(getenv(name)))
+        except (TypeError, ValueError):
+            limits.append(0)
+    return ShardedSessionStore(limits[0] or None, *limits[1:])
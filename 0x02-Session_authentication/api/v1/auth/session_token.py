@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Signed session token module for the API
+"""
+from base64 import urlsafe_b64encode
+from time import time
+import hashlib
+import hmac
+import os
+
+
+class SessionTokenSigner:
+    """
+    Issues and validates stateless session tokens.
+
+    A token is "<user ID>.<expiration timestamp in hex>.<signature>",
+    the signature being an HMAC-SHA256 of the first two parts. Checking
+    a token is pure CPU work, no store is involved. Logged out tokens
+    are kept in a small revocation set until they would have expired.
+
+    Revocations only live in the memory of this process: with several
+    worker processes, a revoked token stays valid in the other workers
+    until it expires.
+    """
+
+    def __init__(self, secret: bytes = None, lifetime: int = 86400):
+        """
+        Initialize a SessionTokenSigner.
+
+        Args:
+            secret (bytes): Signing key, shared by every worker process;
+            a random one only valid in this process is used if missing
+            lifetime (int): Lifetime of a token in seconds
+        """
+        self._secret = secret or os.urandom(32)
+        self.lifetime = lifetime
+        self._revoked = {}
+        self._revoked_users = {}
+        self._next_prune = 0
+
+    def _sign(self, payload: str) -> str:
+        """
+        Signature of a token payload.
+        """
+        digest = hmac.new(self._secret, payload.encode(),
+                          hashlib.sha256).digest()
+        return urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def issue(self, user_id: str) -> str:
+        """
+        Creates a token for a user.
+
+        Args:
+            user_id (str): The user ID
+
+        Returns:
+            str: The signed token
+        """
+        issued_at = int(time())
+        revoked_at = self._revoked_users.get(user_id)
+        if revoked_at is not None and issued_at <= revoked_at:
+            # Issued during the second its user logged out everywhere,
+            # which only revokes the tokens of that second and before
+            issued_at = revoked_at + 1
+        payload = "{}.{:x}".format(user_id, issued_at + self.lifetime)
+        return "{}.{}".format(payload, self._sign(payload))
+
+    def _split(self, token: str):
+        """
+        Splits a token into (payload, user ID, expiration, signature), or
+        returns None if it is malformed. Issued tokens are ASCII, the
+        signature is compared as such.
+        """
+        if not token.isascii():
+            return None
+        parts = token.rsplit('.', 2)
+        if len(parts) != 3:
+            return None
+        user_id, expires_at, signature = parts
+        try:
+            expires_at = int(expires_at, 16)
+        except ValueError:
+            return None
+        return token[:-len(signature) - 1], user_id, expires_at, signature
+
+    def user_id(self, token: str) -> str:
+        """
+        Validates a token.
+
+        Args:
+            token (str): The token to check
+
+        Returns:
+            str: The user ID of a valid, unexpired and not revoked token,
+            None otherwise
+        """
+        parts = self._split(token)
+        if parts is None:
+            return None
+        payload, user_id, expires_at, signature = parts
+        if expires_at < time():
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        if self._revoked and signature in self._revoked:
+            return None
+        if self._revoked_users and user_id in self._revoked_users and \
+                expires_at - self.lifetime <= self._revoked_users[user_id]:
+            return None
+        return user_id
+
+    def revoke(self, token: str) -> bool:
+        """
+        Revokes a valid token until its expiration.
+
+        Args:
+            token (str): The token to revoke
+
+        Returns:
+            bool: True if the token was valid
+        """
+        if self.user_id(token) is None:
+            return False
+        _, _, expires_at, signature = self._split(token)
+        self._revoked[signature] = expires_at
+        self._prune()
+        return True
+
+    def revoke_user(self, user_id: str):
+        """
+        Revokes every token issued to a user so far.
+
+        Tokens carry their time in whole seconds: every token issued
+        during the current second or before is revoked, and the tokens
+        issued afterwards start at the next second.
+
+        Args:
+            user_id (str): The user ID
+        """
+        self._revoked_users[user_id] = int(time())
+        self._prune()
+
+    def _prune(self):
+        """
+        Forgets the revocations of tokens that have expired since.
+        """
+        now = time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        for key, expiration in list(self._revoked.items()):
+            if expiration < now:
+                del self._revoked[key]
+        for key, revoked_at in list(self._revoked_users.items()):
+            if revoked_at + self.lifetime < now:
+                del self._revoked_users[key]
@@ -101,3 +101,28 @@ def session_logout():
 
     # Return empty JSON dictionary with status code 200
     return jsonify({}), 200
+
+
+@app_views.route('/auth_session/logout_all', methods=['DELETE'],
+                 strict_slashes=False)
+def session_logout_all():
+    """
+    Handles logout of every session of the authenticated user.
+
+    This route processes DELETE requests from an authenticated user and
+    destroys all of their sessions, on every device.
+
+    Returns:
+        Response: Empty JSON dictionary on success, or 404 if the
+                 authentication type has no sessions
+    """
+    # Import auth only when needed to avoid circular imports
+    from api.v1.app import auth
+
+    if not hasattr(auth, 'destroy_all_sessions') or \
+            request.current_user is None:
+        abort(404)
+
+    auth.destroy_all_sessions(request.current_user.id)
+
+    return jsonify({}), 200
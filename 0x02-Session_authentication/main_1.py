@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+""" Main 1 - User.get latency from 1k to 1M users
+"""
+import time
+import uuid
+from models.user import User
+
+LOOKUPS = 100000
+
+for total in (1000, 10000, 100000, 1000000):
+    users = []
+    for i in range(total - len(User.search())):
+        user = User()
+        user.email = "{}@hbtn.io".format(uuid.uuid4())
+        users.append(user)
+    User.save_many(users)
+
+    ids = [u.id for u in User.search()[::max(1, total // LOOKUPS)]]
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        User.get(ids[i % len(ids)])
+    elapsed = time.perf_counter() - start
+    print("{:>8} users: {:.0f} ns per User.get".format(
+        total, elapsed / LOOKUPS * 1e9))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Main 10 - snapshot and restore of 1M sessions
+"""
+import os
+import tempfile
+import time
+import uuid
+
+from api.v1.auth.session_snapshot import restore_snapshot, write_snapshot
+from api.v1.auth.session_store import SessionRecord, ShardedSessionStore
+
+SESSIONS = 1000000
+
+now = time.time()
+store = ShardedSessionStore()
+# A tenth of the sessions are already expired when restored
+store.load((str(uuid.uuid4()), SessionRecord(
+    "user-{}".format(i % 50000), now - (7200 if i % 10 == 0 else 60)))
+    for i in range(SESSIONS))
+path = os.path.join(tempfile.mkdtemp(), "sessions.snapshot")
+
+start = time.perf_counter()
+write_snapshot(store, path)
+elapsed = time.perf_counter() - start
+print("write: {:.3f}s, {:.1f} bytes per session".format(
+    elapsed, os.path.getsize(path) / SESSIONS))
+
+restored = ShardedSessionStore()
+start = time.perf_counter()
+count = restore_snapshot(restored, path, now - 3600)
+elapsed = time.perf_counter() - start
+print("restore: {:.3f}s, {} live sessions".format(elapsed, count))
+
+assert count == len(restored) == SESSIONS - SESSIONS // 10
+for session_id, record in list(store.items())[:1000]:
+    assert restored.get(session_id) == (record if record[1] >= now - 3600
+                                        else None)
+assert len(restored.user_sessions("user-1")) == SESSIONS // 50000
+
+# Restored sessions move to the shards when set or touched
+session_ids = [session_id for session_id, record in list(store.items())[:2000]
+               if record[1] >= now - 3600]
+touched, replaced, deleted = session_ids[:3]
+assert restored.touch(touched, now)
+assert restored.get(touched) == (store.get(touched)[0], now)
+restored.set(replaced, SessionRecord("user-x", now))
+assert restored.get(replaced) == ("user-x", now)
+assert restored.delete(deleted) and restored.get(deleted) is None
+assert not restored.delete(deleted) and not restored.touch(deleted)
+assert len(restored) == count - 1
+
+# Expiring the restored sessions leaves the ones moved to the shards
+expired = restored.expire(now - 30)
+assert len(expired) == count - 3, len(expired)
+assert sorted(session_id for session_id, _ in restored.items()) == \
+    sorted([touched, replaced])
+print("touch, set, delete and expire of restored sessions: ok")
+
+# The store survives a snapshot of itself
+write_snapshot(restored, path)
+again = ShardedSessionStore()
+assert restore_snapshot(again, path) == 2
+assert again.get(touched) == (store.get(touched)[0], now)
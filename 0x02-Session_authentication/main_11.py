@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Main 11 - write amplification of sliding sessions
+"""
+import os
+import tempfile
+import time
+
+os.environ['SESSION_DURATION'] = '2'
+os.environ['SESSION_SLIDING'] = '1'
+os.environ['SESSION_TOUCH_FRACTION'] = '0.1'
+os.environ['STORAGE_DIR'] = tempfile.mkdtemp()
+
+from api.v1.auth.session_db_auth import SessionDBAuth  # noqa: E402
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+from api.v1.auth.session_store import SQLiteSessionStore, ShardedSessionStore  # noqa: E402
+
+SESSIONS = 200
+SECONDS = 3
+
+
+def run(name, sa, store):
+    """ Validates every session in a loop for SECONDS seconds
+    """
+    SessionExpAuth.user_id_by_session_id = store
+    SessionExpAuth.validated_count = SessionExpAuth.touched_count = 0
+    session_ids = [sa.create_session("user-{}".format(i))
+                   for i in range(SESSIONS)]
+    end = time.monotonic() + SECONDS
+    while time.monotonic() < end:
+        for session_id in session_ids:
+            assert sa.user_id_for_session_id(session_id) is not None
+    sa.sweep_expired_sessions(force=True)
+    stats = sa.session_stats()
+    print("{}: {} requests, {} touches written, write amplification "
+          "{:.5f} (naive: 1)".format(name, stats['validated'],
+                                     stats['touched'],
+                                     stats['touched'] / stats['validated']))
+    return stats
+
+
+run("memory", SessionExpAuth(), ShardedSessionStore())
+run("sqlite", SessionExpAuth(), SQLiteSessionStore(
+    os.path.join(os.environ['STORAGE_DIR'], 'sessions.db')))
+
+db = SessionDBAuth()
+stats = run("log", db, ShardedSessionStore())
+db.close()
+with open(db.storage.path) as f:
+    lines = sum(1 for _ in f)
+print("log: {} lines for {} creates, {:.5f} touch lines per request".format(
+    lines, SESSIONS, (lines - SESSIONS) / stats['validated']))
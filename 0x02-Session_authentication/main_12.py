@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Main 12 - 1M single-field updates, changed fields vs full record saves
+"""
+import os
+import shutil
+import tempfile
+import time
+
+os.environ['STORAGE_DIR'] = tempfile.mkdtemp()
+
+from models.user import User  # noqa: E402
+
+USERS = 100000
+UPDATES = 1000000
+
+users = []
+for i in range(USERS):
+    user = User(email="user{}@hbtn.io".format(i), first_name="Bob",
+                last_name="Dylan")
+    user.password = "pwd{}".format(i)
+    users.append(user)
+User.save_many(users)
+path = User._storage.path
+# Keeps every written line, so the log growth is what the updates wrote
+User._storage.COMPACT_MIN_GARBAGE = float('inf')
+
+
+def measure(name, update):
+    """ Runs UPDATES updates and reports time and log growth
+    """
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    for i in range(UPDATES):
+        update(users[i % USERS], i)
+    elapsed = time.perf_counter() - start
+    written = os.path.getsize(path) - size
+    print("{}: {:.0f} ns and {:.0f} log bytes per update".format(
+        name, elapsed * 1e9 / UPDATES, written / UPDATES))
+
+
+def full_save(user, i):
+    """ What a save cost before: the whole record rewritten """
+    user.first_name = "Bob{}".format(i % 7)
+    User._storage.set(user.to_record(), False)
+    User._storage.maybe_compact(User._records)
+
+
+def incremental_save(user, i):
+    user.first_name = "Bob{}".format(i % 7)
+    user.save()
+
+
+def noop_save(user, i):
+    user.save()
+
+
+measure("full record save", full_save)
+# Marks every user clean again
+for user in users:
+    user.save()
+measure("changed fields save", incremental_save)
+measure("no-op save", noop_save)
+
+User.load_from_storage()
+assert User.count() == USERS
+assert User.get(users[-1].id).first_name == users[-1].first_name
+assert len(User.search({'email': "user1@hbtn.io"})) == 1
+shutil.rmtree(os.environ['STORAGE_DIR'])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Main 13 - bounded stores and logout everywhere
+"""
+import threading
+import time
+
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import ShardedSessionStore
+
+THREADS = 16
+USERS = 8
+LOGINS = 2000
+
+
+def check(sa, user_ids):
+    """ Compares the per-user listing with the sessions actually stored
+    """
+    store = sa.user_id_by_session_id
+    for user_id in user_ids:
+        stored = sorted(session_id for session_id, record in store.items()
+                        if record.user_id == user_id)
+        assert sorted(sa.user_sessions(user_id)) == stored, user_id
+    for user_id in user_ids:
+        sa.destroy_all_sessions(user_id)
+    assert len(store) == 0, len(store)
+
+
+# Global limit: 200 logins of one user in a 16 session store
+SessionAuth.user_id_by_session_id = ShardedSessionStore(16, max_sessions=16)
+sa = SessionAuth()
+for _ in range(200):
+    sa.create_session("u")
+live = len(sa.user_id_by_session_id)
+listed = len(sa.user_sessions("u"))
+check(sa, ["u"])
+print("max_sessions=16: {} live, {} listed, all logged out".format(
+    live, listed))
+
+# Per-user limit, with threads logging the same users in concurrently
+SessionAuth.user_id_by_session_id = ShardedSessionStore(16, max_per_user=3)
+sa = SessionAuth()
+user_ids = ["user-{}".format(i) for i in range(USERS)]
+
+
+def worker(number):
+    """ Logs every user in LOGINS times, round robin """
+    for i in range(LOGINS):
+        sa.create_session(user_ids[(number + i) % USERS])
+
+
+threads = [threading.Thread(target=worker, args=(n,))
+           for n in range(THREADS)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+counts = [len(sa.user_sessions(user_id)) for user_id in user_ids]
+assert counts == [3] * USERS, counts
+check(sa, user_ids)
+print("max_per_user=3, {} threads: {} sessions per user, all logged "
+      "out".format(THREADS, counts[0]))
+
+# Cost of a login evicting the user's oldest session, by store size
+for others in (10000, 200000):
+    SessionAuth.user_id_by_session_id = ShardedSessionStore(
+        16, max_per_user=3)
+    sa = SessionAuth()
+    for i in range(others):
+        sa.create_session("other-{}".format(i))
+    start = time.perf_counter()
+    for _ in range(LOGINS):
+        sa.create_session("u")
+    elapsed = time.perf_counter() - start
+    print("{:>6} other sessions: {:.1f} us per login at the per-user "
+          "limit".format(others, elapsed * 1e6 / LOGINS))
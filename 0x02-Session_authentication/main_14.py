@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+""" Main 14 - verified Basic credentials cache
+"""
+import base64
+import time
+
+from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.credential_cache import CredentialCache
+from models.user import User
+
+
+class Request:
+    """ Minimal request, a new one per call like in the app """
+
+    def __init__(self, email, password):
+        """ Request with Basic credentials """
+        credentials = "{}:{}".format(email, password).encode()
+        self.headers = {"Authorization": "Basic {}".format(
+            base64.b64encode(credentials).decode())}
+
+
+def create_user(email, password):
+    """ Saves a user """
+    user = User()
+    user.email = email
+    user.password = password
+    user.save()
+    return user
+
+
+def stats(cache):
+    """ (hits, misses, evictions) of a cache """
+    counters = cache.stats()
+    return counters['hits'], counters['misses'], counters['evictions']
+
+
+a = BasicAuth()
+cache = a.credential_cache
+bob = create_user("bob@hbtn.io", "pwd")
+
+# One miss verifies the credentials, the next requests hit
+assert a.current_user(Request("bob@hbtn.io", "pwd")) is bob
+assert stats(cache) == (0, 1, 0), stats(cache)
+for _ in range(3):
+    assert a.current_user(Request("bob@hbtn.io", "pwd")) is bob
+assert stats(cache) == (3, 1, 0), stats(cache)
+print("first request: miss, next 3 requests: hits")
+
+# A new password invalidates the entry verified with the old one
+bob.password = "new pwd"
+bob.save()
+assert a.current_user(Request("bob@hbtn.io", "pwd")) is None
+assert stats(cache) == (3, 2, 0), stats(cache)
+assert a.current_user(Request("bob@hbtn.io", "new pwd")) is bob
+assert a.current_user(Request("bob@hbtn.io", "new pwd")) is bob
+assert stats(cache) == (4, 3, 0), stats(cache)
+print("password changed: old credentials rejected, new ones cached")
+
+# A removed user is not served from the cache
+bob.remove()
+assert a.current_user(Request("bob@hbtn.io", "new pwd")) is None
+assert cache.stats()['size'] == 0
+print("user removed: credentials rejected, entry dropped")
+
+# Entries expire after their TTL
+cache = CredentialCache(max_size=16, ttl=0.2)
+alice = create_user("alice@hbtn.io", "pwd")
+header = Request("alice@hbtn.io", "pwd").headers["Authorization"]
+cache.put(header, alice)
+assert cache.get(header) is alice
+time.sleep(0.3)
+assert cache.get(header) is None
+assert stats(cache) == (1, 1, 0), stats(cache)
+print("ttl elapsed: entry expired")
+
+# The least recently used entries are evicted beyond max_size
+cache = CredentialCache(max_size=4, ttl=60)
+users = [create_user("user{}@hbtn.io".format(i), "pwd") for i in range(6)]
+headers = [Request(user.email, "pwd").headers["Authorization"]
+           for user in users]
+for header, user in zip(headers[:4], users):
+    cache.put(header, user)
+# user0 becomes the most recently used, user1 and user2 go first
+assert cache.get(headers[0]) is users[0]
+cache.put(headers[4], users[4])
+cache.put(headers[5], users[5])
+assert [cache.get(header) is not None for header in headers] == \
+    [True, False, False, True, True, True]
+assert cache.stats()['size'] == 4
+assert cache.evictions == 2, cache.evictions
+print("max_size=4, 6 users: {} evictions, least recently used first".format(
+    cache.evictions))
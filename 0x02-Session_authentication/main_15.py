@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Main 15 - DELETE /auth_session/logout_all
+"""
+import os
+
+os.environ['AUTH_TYPE'] = 'session_auth'
+os.environ['SESSION_NAME'] = '_my_session_id'
+
+from api.v1.app import app  # noqa: E402
+from models.user import User  # noqa: E402
+
+for email in ("bob@hbtn.io", "alice@hbtn.io"):
+    user = User()
+    user.email = email
+    user.password = "pwd"
+    user.save()
+
+
+def login(email):
+    """ Logs in from a new device, returns its client """
+    client = app.test_client()
+    response = client.post('/api/v1/auth_session/login',
+                           data={'email': email, 'password': 'pwd'})
+    assert response.status_code == 200, response.status_code
+    return client
+
+
+def me(client):
+    """ Status of GET /users/me for a device """
+    return client.get('/api/v1/users/me').status_code
+
+
+bob_devices = [login("bob@hbtn.io") for _ in range(3)]
+alice_devices = [login("alice@hbtn.io") for _ in range(2)]
+assert [me(client) for client in bob_devices + alice_devices] == [200] * 5
+
+# Anonymous requests cannot log anybody out
+assert app.test_client().delete(
+    '/api/v1/auth_session/logout_all').status_code == 401
+
+response = bob_devices[0].delete('/api/v1/auth_session/logout_all')
+assert response.status_code == 200 and response.get_json() == {}
+bob = [me(client) for client in bob_devices]
+alice = [me(client) for client in alice_devices]
+assert bob == [403] * 3, bob
+assert alice == [200] * 2, alice
+print("logout_all: bob's 3 devices logged out ({}), alice's 2 devices "
+      "still logged in ({})".format(bob, alice))
+
+# The cookies of the logged out devices cannot be reused
+assert bob_devices[1].delete(
+    '/api/v1/auth_session/logout_all').status_code == 403
+assert [me(client) for client in alice_devices] == [200] * 2
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+""" Main 2 - Memory per user, default vs compact (USER_COMPACT) mode
+"""
+import os
+import subprocess
+import sys
+
+MEASURE = """
+import tracemalloc
+tracemalloc.start()
+from models.user import User
+first_names = ["Bob", "Alice", "Guillaume", "Maria"]
+users = []
+for i in range(total):
+    user = User()
+    user.email = "user{}@hbtn.io".format(i)
+    user.password = "pwd{}".format(i)
+    # Names built at runtime, like values parsed from a request
+    user.first_name = "".join(first_names[i % 4])
+    user.last_name = "{}son".format(first_names[(i // 4) % 4])
+    users.append(user)
+User.save_many(users)
+del users
+current, _ = tracemalloc.get_traced_memory()
+print(current / total)
+"""
+
+for total in (100000, 1000000):
+    for compact in ("", "1"):
+        env = dict(os.environ, USER_COMPACT=compact)
+        env.pop("STORAGE_DIR", None)
+        out = subprocess.run([sys.executable, "-c",
+                              "total = {}\n{}".format(total, MEASURE)],
+                             env=env, capture_output=True, text=True,
+                             check=True).stdout
+        print("{:>8} users, {:>7} mode: {:.0f} bytes per user".format(
+            total, "compact" if compact else "default", float(out)))
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+""" Main 3 - One user lookup per session-authenticated request
+"""
+import os
+
+os.environ['AUTH_TYPE'] = 'session_auth'
+os.environ['SESSION_NAME'] = '_my_session_id'
+
+from api.v1.app import app, auth  # noqa: E402
+from models.user import User  # noqa: E402
+
+user = User()
+user.email = "bob@hbtn.io"
+user.password = "H0lbertonSchool98!"
+user.save()
+session_id = auth.create_session(user.id)
+
+lookups = []
+user_get = User.get
+
+
+def counting_get(user_id):
+    """ User.get counting its calls """
+    lookups.append(user_id)
+    return user_get(user_id)
+
+
+User.get = counting_get
+client = app.test_client()
+client.set_cookie('_my_session_id', session_id)
+response = client.get('/api/v1/users/me')
+print(response.status_code, response.get_json()['email'])
+print("User.get calls for the request: {}".format(len(lookups)))
+assert len(lookups) == 1
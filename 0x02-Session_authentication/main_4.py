@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+""" Main 4 - require_auth cost with a list vs a compiled PathMatcher
+"""
+import timeit
+from api.v1.auth.auth import Auth, PathMatcher
+
+a = Auth()
+path = "/api/v1/users/me"
+
+for count in (5, 100, 500):
+    excluded_paths = ["/api/v1/excluded_{}/".format(i)
+                      for i in range(count // 2)]
+    excluded_paths += ["/api/v1/public_{}*".format(i)
+                       for i in range(count - count // 2)]
+    matcher = PathMatcher(excluded_paths)
+    assert a.require_auth(path, excluded_paths)
+    assert a.require_auth(path, matcher)
+
+    runs = 2000
+    as_list = timeit.timeit(lambda: a.require_auth(path, excluded_paths),
+                            number=runs) / runs
+    compiled = timeit.timeit(lambda: a.require_auth(path, matcher),
+                             number=runs) / runs
+    print("{:>4} patterns: list {:>8.2f} us, compiled {:.2f} us".format(
+        count, as_list * 1e6, compiled * 1e6))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+""" Main 5 - SessionExpAuth memory stays flat under login churn
+"""
+import os
+import time
+import tracemalloc
+
+os.environ['SESSION_DURATION'] = '1'
+
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+
+sa = SessionExpAuth()
+tracemalloc.start()
+peaks = []
+for second in range(5):
+    end = time.monotonic() + 1
+    while time.monotonic() < end:
+        sa.create_session("user-{}".format(len(peaks)))
+    stats = sa.session_stats()
+    current, _ = tracemalloc.get_traced_memory()
+    peaks.append(current)
+    print("{}s: {} live, {} expired, {:.1f} MB".format(
+        second + 1, stats['live'], stats['expired'], current / 1e6))
+
+# After the first duration, every second expires as much as it creates
+assert max(peaks[2:]) < 1.5 * peaks[1]
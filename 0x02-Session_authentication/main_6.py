@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+""" Main 6 - SessionExpAuth bytes per session and validations per second
+"""
+import os
+import time
+import tracemalloc
+
+os.environ['SESSION_DURATION'] = '3600'
+
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+
+SESSIONS = 200000
+
+sa = SessionExpAuth()
+user_ids = ["user-{}".format(i % 1000) for i in range(SESSIONS)]
+tracemalloc.start()
+session_ids = [sa.create_session(user_id) for user_id in user_ids]
+current, _ = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+# The session IDs are kept by the caller, not by the store
+current -= sum(len(sid) + 49 for sid in session_ids) + 8 * SESSIONS
+print("{:.0f} bytes per session".format(current / SESSIONS))
+
+start = time.perf_counter()
+for session_id in session_ids:
+    sa.user_id_for_session_id(session_id)
+elapsed = time.perf_counter() - start
+print("{:.0f} validations per second".format(SESSIONS / elapsed))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Main 8 - Lookup-based vs signed token validation at 1M live sessions
+"""
+import os
+import tempfile
+import time
+
+os.environ['SESSION_DURATION'] = '3600'
+
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+from api.v1.auth.session_store import SQLiteSessionStore  # noqa: E402
+
+LIVE = 1000000
+CHECKS = 100000
+
+
+def bench(name, validate, ids):
+    """ Time CHECKS validations """
+    start = time.perf_counter()
+    for i in range(CHECKS):
+        assert validate(ids[i % len(ids)]) is not None
+    elapsed = time.perf_counter() - start
+    print("{:>16}: {:.2f} us per validation".format(
+        name, elapsed / CHECKS * 1e6))
+
+
+memory = SessionExpAuth()
+session_ids = [memory.create_session("user-{}".format(i % 1000))
+               for i in range(LIVE)]
+bench("memory lookup", memory.user_id_for_session_id, session_ids)
+
+sqlite = SQLiteSessionStore(os.path.join(tempfile.mkdtemp(), "s.db"))
+connection = sqlite._connection()
+connection.execute("BEGIN")
+connection.executemany("INSERT INTO sessions VALUES (?, ?, ?)",
+                       ((session_id, record[0], record[1])
+                        for session_id, record in
+                        memory.user_id_by_session_id.items()))
+connection.execute("COMMIT")
+bench("sqlite lookup", sqlite.get, session_ids)
+
+os.environ['SESSION_TOKENS'] = 'signed'
+os.environ['SESSION_SECRET'] = 'benchmark secret'
+signed = SessionExpAuth()
+tokens = [signed.create_session("user-{}".format(i)) for i in range(1000)]
+bench("signed token", signed.user_id_for_session_id, tokens)
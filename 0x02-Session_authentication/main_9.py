@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+""" Main 9 - SessionExpAuth under 32 threads, sharded vs single lock store
+
+Each configuration runs RUNS times and reports the median throughput: a
+single run varies by about 10% on a loaded host.
+"""
+import os
+import threading
+import time
+
+os.environ['SESSION_DURATION'] = '3600'
+
+from api.v1.auth.session_exp_auth import SessionExpAuth  # noqa: E402
+from api.v1.auth.session_store import ShardedSessionStore  # noqa: E402
+
+THREADS = 32
+ROUNDS = 5000
+RUNS = 3
+
+# Unbounded store, least-recently-used eviction, sessions per user limit
+PATHS = (("unbounded", {}), ("LRU", {"max_sessions": 50000}),
+         ("per-user", {"max_per_user": 3}))
+
+
+def worker(sa, number, barrier, errors):
+    """ Creates, checks and destroys sessions of its own users
+    """
+    user_ids = ["user-{}-{}".format(number, i) for i in range(8)]
+    kept = []
+    barrier.wait()
+    for i in range(ROUNDS):
+        user_id = user_ids[i % len(user_ids)]
+        session_id = sa.create_session(user_id)
+        if sa.user_id_for_session_id(session_id) != user_id:
+            errors.append(session_id)
+        if i % 2:
+            sa.user_id_by_session_id.delete(session_id)
+            if sa.user_id_for_session_id(session_id) is not None:
+                errors.append(session_id)
+        else:
+            kept.append((session_id, user_id))
+    for session_id, user_id in kept:
+        if sa.user_id_for_session_id(session_id) != user_id:
+            errors.append(session_id)
+    if sum(len(sa.user_sessions(u)) for u in user_ids) != len(kept):
+        errors.append(number)
+
+
+def churn(sa, number, barrier, errors):
+    """ Creates, checks and destroys sessions, on a bounded store where
+    sessions may be evicted meanwhile
+    """
+    user_ids = ["user-{}-{}".format(number, i) for i in range(8)]
+    barrier.wait()
+    for i in range(ROUNDS):
+        session_id = sa.create_session(user_ids[i % len(user_ids)])
+        sa.user_id_for_session_id(session_id)
+        if i % 2:
+            sa.user_id_by_session_id.delete(session_id)
+
+
+def run(shards, limits):
+    """ Runs every worker on a fresh store, checks the final state of an
+    unbounded one, and returns the operations per second
+    """
+    SessionExpAuth.user_id_by_session_id = ShardedSessionStore(shards,
+                                                               **limits)
+    sa = SessionExpAuth()
+    barrier = threading.Barrier(THREADS + 1)
+    errors = []
+    target = churn if limits else worker
+    threads = [threading.Thread(target=target,
+                                args=(sa, n, barrier, errors))
+               for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    assert not errors, errors[:5]
+    if not limits:
+        assert len(sa.user_id_by_session_id) == THREADS * ROUNDS // 2
+    return THREADS * ROUNDS * 3 / elapsed
+
+
+for name, limits in PATHS:
+    for shards in (1, 16):
+        rates = sorted(run(shards, limits) for _ in range(RUNS))
+        print("{:>9}, {:2d} shard(s): {:.0f}k operations per second "
+              "(median of {}, {:.0f}k to {:.0f}k)".format(
+                  name, shards, rates[RUNS // 2] / 1000, RUNS,
+                  rates[0] / 1000, rates[-1] / 1000))
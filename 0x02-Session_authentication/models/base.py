@@ -0,0 +1,703 @@
+#!/usr/bin/env python3
+"""
+Base module - indexed in-memory model core and file-backed storage
+"""
+import gc
+import json
+import os
+import uuid
+from datetime import datetime
+from itertools import count
+from operator import attrgetter
+from os import getenv
+from time import time
+from typing import Callable, Dict, Iterable, Iterator, List
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Last (epoch second, datetime) returned by utcnow()
+_clock = (None, None)
+
+# Positions given to objects moved to the end of their class dictionary
+_positions = count()
+
+
+def utcnow() -> datetime:
+    """Current UTC time, truncated to the second like TIMESTAMP_FORMAT
+
+    Objects created or saved during the same second share one datetime
+    instead of each holding their own.
+    """
+    global _clock
+    second = int(time())
+    if _clock[0] != second:
+        _clock = (second, datetime.utcfromtimestamp(second))
+    return _clock[1]
+
+
+class LogStorage:
+    """Append-only JSON-lines storage of one model class
+
+    Each save appends one line holding the full record of the saved
+    object, or only its changed fields for an update, and each delete
+    appends one tombstone line, so the cost of a write only depends on
+    the size of the change. Loading streams the file line by line and
+    keeps the last state of each id.
+    The log is rewritten with only the live records once it holds too
+    many superseded lines.
+    """
+
+    # Compact once the log holds this many lines more than live records
+    COMPACT_MIN_GARBAGE = 10000
+
+    # Approximate size in bytes of the blocks read by load()
+    READ_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path: str, fsync: bool = False):
+        """Initialize a LogStorage
+
+        Args:
+            path: Path of the log file
+            fsync: Force every write to disk before returning
+        """
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self._lines = 0
+        self._live = 0
+
+    def load(self) -> Dict[str, dict]:
+        """Read the log and return the live records
+
+        Returns:
+            Dictionary of id -> record, in save order
+        """
+        records = {}
+        self._lines = 0
+        self._drop_torn_tail()
+        for op, value in self._read_lines():
+            self._lines += 1
+            if op == "set":
+                # Re-saved objects move to the end, like in memory
+                obj_id = value["id"]
+                if obj_id in records:
+                    del records[obj_id]
+                records[obj_id] = value
+            elif op == "upd":
+                record = records.pop(value["id"], None)
+                if record is not None:
+                    record.update(value)
+                    records[value["id"]] = record
+            else:
+                records.pop(value, None)
+        self._live = len(records)
+        return records
+
+    def _drop_torn_tail(self):
+        """Truncate the log after its last complete line
+
+        A write torn by a crash leaves a fragment without a newline, the
+        next append would be glued to it and dropped with it on load.
+        """
+        try:
+            f = open(self.path, "rb+")
+        except FileNotFoundError:
+            return
+        with f:
+            size = end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+
+    def _read_lines(self) -> Iterator[list]:
+        """Stream the decoded lines of the log file
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            while True:
+                # Decoding a chunk of lines as one JSON array is several
+                # times faster than one json.loads() call per line
+                lines = f.readlines(self.READ_CHUNK_SIZE)
+                if not lines:
+                    break
+                try:
+                    yield from json.loads("[" + ",".join(lines) + "]")
+                except ValueError:
+                    yield from self._decode_lines(lines)
+
+    @staticmethod
+    def _decode_lines(lines: list) -> Iterator[list]:
+        """Decode lines one by one, skipping the invalid ones
+        """
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Torn last line after a crash: the write never
+                # completed so the record is not part of the log
+                continue
+
+    def _append(self, entry: list):
+        """Append one entry to the log
+        """
+        self._write([entry])
+
+    def _write(self, entries: List[list]):
+        """Append entries to the log with a single write
+        """
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(entry, separators=(",", ":")) +
+                                 "\n" for entry in entries))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._lines += len(entries)
+
+    def set(self, record: dict, created: bool = True):
+        """Append the new state of a record
+
+        Args:
+            record: Serialized object, with an "id" key
+            created: True if the id was not live in the log yet
+        """
+        self._append(["set", record])
+        if created:
+            self._live += 1
+
+    def update(self, fields: dict):
+        """Append the changed fields of a live record
+
+        Args:
+            fields: Changed attribute name -> value, with an "id" key
+        """
+        self._append(["upd", fields])
+
+    def delete(self, obj_id: str):
+        """Append a tombstone for a record
+
+        Args:
+            obj_id: Id of the deleted object
+        """
+        self._append(["del", obj_id])
+        self._live -= 1
+
+    def write_batch(self, entries: List[list], created: bool = True):
+        """Append a batch of new records and tombstones at once
+
+        Args:
+            entries: List of ["set", record] or ["del", id] entries
+            created: True if every set record is a newly created object,
+            False if they all update live ones
+        """
+        if not entries:
+            return
+        self._write(entries)
+        for op, _ in entries:
+            if op != "set":
+                self._live -= 1
+            elif created:
+                self._live += 1
+
+    def needs_compaction(self) -> bool:
+        """Tell if the log holds enough superseded lines to be rewritten
+        """
+        garbage = self._lines - self._live
+        return garbage > max(self._live, self.COMPACT_MIN_GARBAGE)
+
+    def compact(self, records: Iterable[dict]):
+        """Rewrite the log with only the given live records
+
+        The new log is written next to the old one and atomically moved
+        in place, so a crash during compaction leaves the old log intact.
+
+        Args:
+            records: Every live serialized object
+        """
+        self.close()
+        tmp_path = self.path + ".tmp"
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(["set", record],
+                                   separators=(",", ":")) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = count
+        self._live = count
+
+    def maybe_compact(self, records: Callable[[], Iterable[dict]],
+                      live: int = None):
+        """Compact the log if needed
+
+        Args:
+            records: Callable returning every live serialized object
+            live: Number of live records, when the caller counts them
+            better than the log
+        """
+        if live is not None:
+            self._live = live
+        if self.needs_compaction():
+            self.compact(records())
+
+    def close(self):
+        """Close the log file
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def storage_for(class_name: str) -> LogStorage:
+    """Return the storage of a model class
+
+    Models are only persisted when the STORAGE_DIR environment variable
+    is set, in which case each class gets its own .db_<class>.jsonl log
+    in that directory. Setting STORAGE_FSYNC makes every write wait for
+    the disk.
+
+    Args:
+        class_name: Name of the model class
+
+    Returns:
+        LogStorage instance or None if persistence is disabled
+    """
+    directory = getenv('STORAGE_DIR')
+    if not directory:
+        return None
+    return LogStorage(os.path.join(directory,
+                                   ".db_{}.jsonl".format(class_name)),
+                      fsync=bool(getenv('STORAGE_FSYNC')))
+
+
+class Base:
+    """Base class of the models
+
+    Every subclass gets its own id -> object dictionary, kept in save
+    order, so get() is O(1), and one value -> objects hash index per
+    attribute declared in _indexed_attributes, kept in sync on save,
+    remove and attribute changes, so search() on an indexed attribute
+    only checks the matching objects. Every object moved to the end of
+    the dictionary gets the next position, so the matches of an index
+    bucket are returned in save order too. Subclasses listing attributes
+    in _persisted_attributes are also written to their storage log.
+    """
+
+    # No instance dictionary of its own: subclasses get one unless they
+    # declare __slots__ too
+    __slots__ = ()
+
+    # Attributes with a maintained value -> objects hash index
+    _indexed_attributes = ()
+
+    # Attributes written to the storage log, None if not persisted
+    _persisted_attributes = None
+
+    # Class-level defaults, so reading them never materializes __dict__.
+    # _position is the place of a saved object in save order, None while
+    # it is not saved
+    _position = None
+    _dirty = None
+
+    # Bookkeeping of the store, never part of the serialized object
+    _state_attributes = ('_position', '_dirty')
+
+    def __init_subclass__(cls, **kwargs):
+        """Give each model class its own objects, indexes and storage
+        """
+        super().__init_subclass__(**kwargs)
+        cls._objects = {}
+        cls._indexes = {}
+        cls._storage = storage_for(cls.__name__) \
+            if cls._persisted_attributes else None
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """Initialize a model instance
+
+        Args:
+            *args: Variable length argument list
+            **kwargs: Attribute values, id, created_at and updated_at are
+            generated if missing
+        """
+        self.id = kwargs.get('id') or str(uuid.uuid4())
+        self.created_at = self._parse_time(kwargs.get('created_at'))
+        self.updated_at = self._parse_time(kwargs.get('updated_at'))
+
+    def __setattr__(self, name, value):
+        """Keep the dictionary and hash indexes in sync when the id or an
+        indexed attribute of a saved object changes, and record which
+        attributes of a saved object changed since it was saved
+        """
+        if self._position is None:
+            object.__setattr__(self, name, value)
+            return
+        if name != 'id':
+            dirty = self._dirty
+            if dirty is None:
+                object.__setattr__(self, '_dirty', {name})
+            else:
+                dirty.add(name)
+        if name == 'id':
+            cls = type(self)
+            del cls._objects[self.id]
+            cls._objects[value] = self
+            object.__setattr__(self, '_position', next(_positions))
+            if cls._storage is not None:
+                cls._storage.delete(self.id)
+            object.__setattr__(self, name, value)
+            if cls._storage is not None:
+                cls._storage.set(self.to_record())
+        elif name in self._indexed_attributes:
+            self._unindex_attribute(name)
+            object.__setattr__(self, name, value)
+            self._index_attribute(name)
+        else:
+            object.__setattr__(self, name, value)
+
+    @staticmethod
+    def _parse_time(value) -> datetime:
+        """Timestamp from a datetime or string, now if missing
+        """
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, str):
+            return datetime.strptime(value, TIMESTAMP_FORMAT)
+        return utcnow()
+
+    def _index_attribute(self, name):
+        """Add this object to the index bucket of one attribute
+        """
+        index = self._indexes.setdefault(name, {})
+        value = getattr(self, name)
+        try:
+            bucket = index.get(value)
+        except TypeError:
+            # Unhashable values are only found by a full scan
+            return
+        # A value held by a single object maps to that object directly,
+        # shared values map to a dict keyed by object identity so removal
+        # is O(1)
+        if bucket is None:
+            index[value] = self
+        elif type(bucket) is dict:
+            bucket[id(self)] = self
+        elif bucket is not self:
+            index[value] = {id(bucket): bucket, id(self): self}
+
+    def _unindex_attribute(self, name):
+        """Remove this object from the index bucket of one attribute
+        """
+        index = self._indexes.get(name, {})
+        try:
+            bucket = index.get(getattr(self, name))
+        except TypeError:
+            return
+        if bucket is self:
+            del index[getattr(self, name)]
+        elif type(bucket) is dict:
+            bucket.pop(id(self), None)
+            if len(bucket) == 1:
+                index[getattr(self, name)] = next(iter(bucket.values()))
+
+    @staticmethod
+    def _bucket_objects(bucket) -> list:
+        """List the objects of an index bucket
+        """
+        if bucket is None:
+            return []
+        if type(bucket) is dict:
+            return list(bucket.values())
+        return [bucket]
+
+    def to_json(self, for_serialization: bool = False) -> dict:
+        """Convert the object to a JSON dictionary
+
+        Args:
+            for_serialization: Also include the private attributes, bytes
+            hex-encoded like in to_record()
+
+        Returns:
+            Dictionary of attribute name -> JSON value
+        """
+        attributes = getattr(self, '__dict__', None)
+        if attributes is None:
+            # Slotted object: its set slots are its attributes
+            attributes = {name: getattr(self, name)
+                          for name in type(self).__slots__
+                          if hasattr(self, name)}
+        result = {}
+        for key, value in attributes.items():
+            if key[0] == '_' and (not for_serialization or
+                                  key in self._state_attributes):
+                continue
+            if isinstance(value, datetime):
+                result[key] = value.strftime(TIMESTAMP_FORMAT)
+            elif type(value) is bytes:
+                result[key] = value.hex()
+            else:
+                result[key] = value
+        return result
+
+    def to_record(self, names: Iterable[str] = None) -> dict:
+        """Serialize the persisted attributes of the object
+
+        Args:
+            names: Only serialize these attributes and the id
+
+        Returns:
+            Dictionary of attribute name -> JSON value
+        """
+        if names is None:
+            names = self._persisted_attributes
+        else:
+            names = ['id'] + [name for name in names
+                              if name in self._persisted_attributes]
+        record = {}
+        for name in names:
+            value = getattr(self, name, None)
+            if isinstance(value, datetime):
+                value = value.strftime(TIMESTAMP_FORMAT)
+            elif type(value) is bytes:
+                value = value.hex()
+            record[name] = value
+        return record
+
+    @classmethod
+    def _from_record(cls, record: dict, times: dict) -> "Base":
+        """Build a saved object from its storage record
+
+        Args:
+            record: Record read from the storage log, owned by the object
+            times: Cache of the timestamps already parsed
+
+        Returns:
+            The new object
+        """
+        for name in ('created_at', 'updated_at'):
+            value = record.get(name)
+            parsed = times.get(value)
+            if parsed is None:
+                # Records saved before timestamps were persisted all get
+                # the load time
+                parsed = times[value] = cls._parse_time(value)
+            record[name] = parsed
+        obj = cls.__new__(cls)
+        # The decoded record becomes the instance dictionary
+        object.__setattr__(obj, '__dict__', record)
+        return obj
+
+    def save(self):
+        """Save the object in its class dictionary and storage
+
+        Saving an unchanged saved object does nothing. Saving a changed
+        one only writes its changed attributes: its indexes are already
+        up to date.
+        """
+        if self._position is not None:
+            dirty = self._dirty
+            if dirty is None:
+                return
+            self._save_changes(dirty)
+            return
+        cls = type(self)
+        object.__setattr__(self, 'updated_at', utcnow())
+        # Remove existing object with same id if any, so the saved object
+        # moves to the end like a fresh insert
+        existing = cls._objects.pop(self.id, None)
+        if existing is not None:
+            existing._remove_from_indexes()
+        cls._objects[self.id] = self
+        for name in self._indexed_attributes:
+            self._index_attribute(name)
+        object.__setattr__(self, '_position', next(_positions))
+        if cls._storage is not None:
+            cls._storage.set(self.to_record(), existing is None)
+            cls._storage.maybe_compact(cls._records)
+
+    def _save_changes(self, dirty: set):
+        """Persist the changed attributes of a saved object
+        """
+        cls = type(self)
+        object.__setattr__(self, '_dirty', None)
+        object.__setattr__(self, 'updated_at', utcnow())
+        # Moves to the end like a fresh save
+        objects = cls._objects
+        del objects[self.id]
+        objects[self.id] = self
+        object.__setattr__(self, '_position', next(_positions))
+        if cls._storage is not None:
+            dirty.add('updated_at')
+            cls._storage.update(self.to_record(dirty))
+            cls._storage.maybe_compact(cls._records)
+
+    def _remove_from_indexes(self):
+        """Drop this object from every index and mark it as not saved
+        """
+        for name in self._indexed_attributes:
+            self._unindex_attribute(name)
+        object.__setattr__(self, '_position', None)
+        if self._dirty is not None:
+            object.__setattr__(self, '_dirty', None)
+
+    def remove(self):
+        """Remove the object from its class dictionary and storage
+        """
+        cls = type(self)
+        if cls._objects.get(self.id) is not self:
+            return
+        del cls._objects[self.id]
+        self._remove_from_indexes()
+        if cls._storage is not None:
+            cls._storage.delete(self.id)
+            cls._storage.maybe_compact(cls._records)
+
+    # Name of remove() in the original model API
+    delete = remove
+
+    @classmethod
+    def _records(cls) -> Iterator[dict]:
+        """Serialize every saved object
+        """
+        return (obj.to_record() for obj in cls._objects.values())
+
+    @classmethod
+    def load_from_storage(cls):
+        """Load every object from the storage log, replacing the objects
+        currently in memory
+        """
+        # The replaced objects no longer belong to the class dictionary
+        for obj in cls._objects.values():
+            object.__setattr__(obj, '_position', None)
+        cls._objects = {}
+        cls._indexes = {}
+        if cls._storage is None:
+            return
+        # Only new objects are allocated here, so the cyclic garbage
+        # collector would just rescan them over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            objects = cls._objects
+            from_record = cls._from_record
+            times = {}
+            for obj_id, record in cls._storage.load().items():
+                obj = from_record(record, times)
+                object.__setattr__(obj, '_position', next(_positions))
+                objects[obj_id] = obj
+            for name in cls._indexed_attributes:
+                for obj in objects.values():
+                    obj._index_attribute(name)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    @classmethod
+    def save_many(cls, objects: Iterable["Base"]):
+        """Save several objects at once
+
+        Args:
+            objects: Iterable of instances to save
+        """
+        for obj in objects:
+            obj.save()
+
+    @classmethod
+    def count(cls) -> int:
+        """Count the saved objects of the class
+        """
+        return len(cls._objects)
+
+    @classmethod
+    def all(cls) -> list:
+        """Return every saved object of the class, in save order
+        """
+        return list(cls._objects.values())
+
+    @classmethod
+    def get(cls, obj_id: str) -> "Base":
+        """Get an object by its id
+
+        Args:
+            obj_id: The id of the object
+
+        Returns:
+            Instance or None if not found
+        """
+        try:
+            return cls._objects.get(obj_id)
+        except TypeError:
+            return None
+
+    @classmethod
+    def get_many(cls, obj_ids: Iterable[str]) -> list:
+        """Get several objects by id
+
+        Args:
+            obj_ids: Iterable of ids
+
+        Returns:
+            List of the instances found, in the order of obj_ids
+        """
+        objects = []
+        for obj_id in obj_ids:
+            obj = cls.get(obj_id)
+            if obj is not None:
+                objects.append(obj)
+        return objects
+
+    @classmethod
+    def search(cls, attributes: dict = {}) -> list:
+        """Search objects with matching attributes
+
+        Args:
+            attributes: Dictionary of attributes to match
+
+        Returns:
+            List of instances that match all attributes
+        """
+        if not attributes:
+            return list(cls._objects.values())
+
+        # Start from the smallest index bucket of the queried attributes
+        # and only check the remaining attributes on those candidates
+        candidates = cls._objects.values()
+        for key, value in attributes.items():
+            try:
+                if key == 'id':
+                    bucket = cls._bucket_objects(cls._objects.get(value))
+                elif key in cls._indexed_attributes:
+                    bucket = cls._bucket_objects(
+                        cls._indexes.get(key, {}).get(value))
+                else:
+                    continue
+            except TypeError:
+                continue
+            if len(bucket) < len(candidates):
+                candidates = bucket
+            if not candidates:
+                return []
+
+        if len(candidates) > 1 and type(candidates) is list:
+            # Buckets are in indexing order, not save order
+            candidates.sort(key=attrgetter('_position'))
+        matching = []
+        for obj in candidates:
+            for key, value in attributes.items():
+                if not hasattr(obj, key) or getattr(obj, key) != value:
+                    break
+            else:
+                matching.append(obj)
+        return matching
@@ -3,30 +3,62 @@
 User module
 """
 import hashlib
-import uuid
-from typing import List
+import sys
+from os import getenv
+from models.base import Base
 
 
-class User:
+class User(Base):
     """User class
     """
-    
-    # Class variable to store all users (simulating a database)
-    _users = []
-    
-    def __init__(self):
+
+    # search() on email uses a hash index, lookups by id go through the
+    # class dictionary itself
+    _indexed_attributes = ('email',)
+
+    # Attributes written to the storage log
+    _persisted_attributes = ('id', 'email', '_password', 'first_name',
+                             'last_name', 'created_at', 'updated_at')
+
+    # Compact mode keeps the attributes in slots instead of an instance
+    # dictionary, password digests as raw bytes and interns names
+    _compact = getenv('USER_COMPACT', '').lower() in ('1', 'true', 'yes')
+    _interned_attributes = ('first_name', 'last_name')
+
+    if _compact:
+        __slots__ = _persisted_attributes + Base._state_attributes
+
+        def __new__(cls, *args: list, **kwargs: dict):
+            """Create a User with the unsaved defaults of its slots
+            """
+            user = super().__new__(cls)
+            object.__setattr__(user, '_position', None)
+            object.__setattr__(user, '_dirty', None)
+            return user
+
+    def __init__(self, *args: list, **kwargs: dict):
         """Initialize a User instance
         """
-        self.id = str(uuid.uuid4())
-        self.email = None
-        self.password = None
-        self.first_name = None
-        self.last_name = None
-        
+        super().__init__(*args, **kwargs)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+    def __setattr__(self, name, value):
+        """Intern the names in compact mode
+        """
+        if self._compact and name in self._interned_attributes and \
+                type(value) is str:
+            value = sys.intern(value)
+        super().__setattr__(name, value)
+
     @property
     def password(self):
         """Getter for password
         """
+        if type(self._password) is bytes:
+            return self._password.hex()
         return self._password
         
     @password.setter
@@ -35,6 +67,8 @@ class User:
         """
         if pwd is None or not isinstance(pwd, str):
             self._password = None
+        elif self._compact:
+            self._password = hashlib.sha256(pwd.encode()).digest()
         else:
             self._password = hashlib.sha256(pwd.encode()).hexdigest()
             
@@ -49,9 +83,12 @@ class User:
         """
         if pwd is None or not isinstance(pwd, str):
             return False
-        if self.password is None:
+        if self._password is None:
             return False
-        return hashlib.sha256(pwd.encode()).hexdigest() == self.password
+        digest = hashlib.sha256(pwd.encode())
+        if type(self._password) is bytes:
+            return digest.digest() == self._password
+        return digest.hexdigest() == self._password
         
     def display_name(self) -> str:
         """Display User name based on email/first_name/last_name
@@ -65,35 +102,26 @@ class User:
         if self.first_name is None:
             return "{}".format(self.last_name)
         return "{} {}".format(self.first_name, self.last_name)
-        
-    def save(self):
-        """Save the user to the database (class variable)
-        """
-        # Remove existing user with same id if any
-        User._users = [u for u in User._users if u.id != self.id]
-        # Add this user
-        User._users.append(self)
-        
+
     @classmethod
-    def search(cls, attributes: dict = {}) -> List["User"]:
-        """Search users with matching attributes
-        
-        Args:
-            attributes: Dictionary of attributes to match
-            
-        Returns:
-            List of User instances that match all attributes
+    def _from_record(cls, record, times):
+        """Build a saved user from its storage record
         """
-        if not attributes:
-            return cls._users
-            
-        matching_users = []
-        for user in cls._users:
-            match = True
-            for key, value in attributes.items():
-                if not hasattr(user, key) or getattr(user, key) != value:
-                    match = False
-                    break
-            if match:
-                matching_users.append(user)
-        return matching_users
\ No newline at end of file
+        if not cls._compact:
+            return super()._from_record(record, times)
+        user = cls.__new__(cls)
+        # The record is copied into the slots, then dropped
+        for name, value in record.items():
+            user.__setattr__(name, value)
+        for name in ('created_at', 'updated_at'):
+            value = record.get(name)
+            parsed = times.get(value)
+            if parsed is None:
+                parsed = times[value] = cls._parse_time(value)
+            object.__setattr__(user, name, parsed)
+        if user._password is not None:
+            user._password = bytes.fromhex(user._password)
+        return user
+
+
+User.load_from_storage()
@@ -10,8 +10,11 @@ class UserSession(Base):
     UserSession class that inherits from Base.
     This class represents a user session stored in the database,
     providing persistence for session data beyond application restarts.
+    Saved sessions are indexed by user_id and session_id.
     """
 
+    _indexed_attributes = ('user_id', 'session_id')
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a UserSession instance.
@@ -10,6 +10,17 @@ AUTH = Auth()
 app = Flask(__name__)
 
 
+@app.teardown_appcontext
+def remove_db_session(exception: BaseException = None) -> None:
+    """
+    Release the database session of the request's thread.
+
+    Args:
+        exception (BaseException): Error that ended the request, if any
+    """
+    AUTH._db.remove_session()
+
+
 @app.route("/", methods=["GET"], strict_slashes=False)
 def index() -> str:
     """
@@ -97,13 +97,10 @@ class Auth:
         Returns:
             str or None: Session ID if user exists, None otherwise
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            session_id = _generate_uuid()
-            self._db.update_user(user.id, session_id=session_id)
+        session_id = _generate_uuid()
+        if self._db.update_user_if({'email': email}, session_id=session_id):
             return session_id
-        except NoResultFound:
-            return None
+        return None
 
     def get_user_from_session_id(self, session_id: str) -> Union[User, None]:
         """
@@ -146,18 +143,21 @@ class Auth:
         Raises:
             ValueError: If user does not exist
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            reset_token = _generate_uuid()
-            self._db.update_user(user.id, reset_token=reset_token)
-            return reset_token
-        except NoResultFound:
+        reset_token = _generate_uuid()
+        if not self._db.update_user_if({'email': email},
+                                       reset_token=reset_token):
             raise ValueError(f"User with email {email} does not exist")
+        return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """
         Update user's password using reset token.
 
+        The token is looked up first, so an invalid token is rejected
+        without paying for bcrypt. The token is then checked again and
+        cleared by the same statement that sets the password, so it can
+        only be used once.
+
         Args:
             reset_token (str): Reset token
             password (str): New password
@@ -165,12 +165,15 @@ class Auth:
         Raises:
             ValueError: If reset token is invalid
         """
+        if reset_token is None:
+            raise ValueError("Invalid reset token")
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
-            hashed_password = _hash_password(password)
-            self._db.update_user(
-                user.id,
-                hashed_password=hashed_password.decode('utf-8'),
-                reset_token=None)
+            user_id = self._db.find_user_id_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError("Invalid reset token")
+        hashed_password = _hash_password(password)
+        if not self._db.update_user_if(
+                {'id': user_id, 'reset_token': reset_token},
+                hashed_password=hashed_password.decode('utf-8'),
+                reset_token=None):
+            raise ValueError("Invalid reset token")
@@ -2,9 +2,14 @@
 """
 DB module for database operations.
 """
-from sqlalchemy import create_engine
+from os import getenv
+from sqlalchemy import (Column, Integer, MetaData, Table, and_,
+                        create_engine, event, inspect, select)
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import InvalidRequestError
@@ -12,33 +17,177 @@ from typing import Dict, Any
 
 from user import Base, User
 
+DEFAULT_URL = "sqlite:///a.db"
+
+# Columns update_user() and update_user_if() accept
+USER_COLUMNS = frozenset(User.__table__.columns.keys())
+
+# Pragmas run on every new connection to an SQLite database file, as
+# (pragma, environment variable, default value). WAL lets readers run
+# while a writer commits, NORMAL synchronous only syncs at checkpoints in
+# WAL mode, the page cache is in KiB when negative.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'DB_JOURNAL_MODE', 'WAL'),
+    ('synchronous', 'DB_SYNCHRONOUS', 'NORMAL'),
+    ('mmap_size', 'DB_MMAP_SIZE', str(256 << 20)),
+    ('cache_size', 'DB_CACHE_SIZE', str(-(64 << 10))),
+    ('busy_timeout', 'DB_BUSY_TIMEOUT', '5000'),
+)
+
+
+def create_db_engine(url: str, tuned: bool = True) -> Engine:
+    """
+    Create the engine of a database.
+
+    Engines of SQLite database files get the SQLITE_PRAGMAS profile on
+    each connection and a pool of DB_POOL_SIZE (default 8) connections
+    shared by every thread, instead of one connection per checkout.
+
+    Args:
+        url (str): Database URL
+        tuned (bool): Apply the SQLite profile
+
+    Returns:
+        Engine: The engine
+    """
+    database = make_url(url).database
+    if not tuned or not url.startswith('sqlite') or \
+            database in (None, '', ':memory:'):
+        return create_engine(url, echo=False)
+
+    pragmas = ["PRAGMA {} = {}".format(name, getenv(variable, default))
+               for name, variable, default in SQLITE_PRAGMAS]
+    try:
+        pool_size = int(getenv('DB_POOL_SIZE'))
+    except (TypeError, ValueError):
+        pool_size = 8
+    engine = create_engine(url, echo=False, poolclass=QueuePool,
+                           pool_size=pool_size, max_overflow=0,
+                           connect_args={'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        """
+        Apply the SQLite profile to a new connection.
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+# Number of migrations applied to a persistent database
+schema_version = Table('schema_version', MetaData(),
+                       Column('version', Integer, nullable=False))
+
+
+def _create_missing_indexes(engine: Engine) -> None:
+    """
+    Create the indexes declared on the models that an existing
+    database lacks, e.g. one created before they were declared.
+
+    Args:
+        engine (Engine): Engine of the database
+
+    Raises:
+        IntegrityError: When existing rows violate a unique index
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name']
+                    for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
+
+# Schema changes of persistent databases, in order. Tables created by
+# create_all() are already up to date, a migration only has to upgrade
+# databases created by an older version and must be idempotent.
+MIGRATIONS = (
+    _create_missing_indexes,
+)
+
 
 class DB:
     """
     DB class for database operations.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = None, persistent: bool = None) -> None:
         """
         Initialize a new DB instance.
+
+        Args:
+            url (str): Database URL, defaults to the DB_URL environment
+            variable or sqlite:///a.db
+            persistent (bool): Keep the existing data, only creating the
+            missing tables and applying the pending migrations. Defaults
+            to the DB_PERSISTENT environment variable, otherwise every
+            table is dropped and recreated.
+        """
+        self._engine = create_db_engine(url or getenv('DB_URL',
+                                                      DEFAULT_URL))
+        if persistent is None:
+            persistent = getenv('DB_PERSISTENT', '').lower() in \
+                ('1', 'true', 'yes')
+        if persistent:
+            self._migrate()
+        else:
+            Base.metadata.drop_all(self._engine)
+            Base.metadata.create_all(self._engine)
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+
+    def _migrate(self) -> int:
+        """
+        Bring a persistent database up to date: create the missing
+        tables and apply the migrations it has not seen yet.
+
+        An up-to-date database costs one table existence check per model
+        and one read of schema_version, whatever its size.
+
+        Returns:
+            int: The number of migrations applied
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        schema_version.create(bind=self._engine, checkfirst=True)
+        with self._engine.connect() as connection:
+            version = connection.execute(
+                select([schema_version.c.version])).scalar() or 0
+        for number in range(version, len(MIGRATIONS)):
+            MIGRATIONS[number](self._engine)
+            with self._engine.begin() as connection:
+                connection.execute(schema_version.delete())
+                connection.execute(schema_version.insert(),
+                                   {'version': number + 1})
+        return max(len(MIGRATIONS) - version, 0)
 
     @property
     def _session(self) -> Session:
         """
-        Memoized session object.
+        Session object of the current thread.
+
+        Each thread gets its own session, created on first use, so that
+        concurrent requests of a threaded server neither share objects nor
+        wait on each other's transactions.
 
         Returns:
             Session: SQLAlchemy session object
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """
+        Close the session of the current thread, ending its transaction
+        and returning its connection to the pool. The next use of
+        _session starts a new one.
+
+        Called at the end of every request, objects loaded before are
+        detached.
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """
@@ -83,23 +232,96 @@ class DB:
         except TypeError:
             raise InvalidRequestError("Invalid query arguments")
 
-    def update_user(self, user_id: int, **kwargs: Any) -> None:
+    def find_user_id_by(self, **kwargs: Any) -> int:
         """
-        Update a user's attributes.
+        Find the ID of a user by column values, with a SELECT of the id
+        column only, without loading the user.
+
+        Args:
+            **kwargs: Column values the user must have
+
+        Returns:
+            int: The ID of the first user found matching the criteria
+
+        Raises:
+            NoResultFound: When no user is found
+            ValueError: When an invalid attribute or no criteria is passed
+        """
+        users = User.__table__
+        statement = select([users.c.id]).where(
+            self._where(users, kwargs)).limit(1)
+        user_id = self._session.execute(statement).scalar()
+        if user_id is None:
+            raise NoResultFound("No user found with the given criteria")
+        return user_id
+
+    def update_user(self, user_id: int, **kwargs: Any) -> int:
+        """
+        Update a user's attributes with a single UPDATE statement,
+        without loading the user.
 
         Args:
             user_id (int): The user's ID
             **kwargs: Arbitrary keyword arguments
             representing attributes to update
 
+        Returns:
+            int: The number of users updated, 0 when no user has this ID
+
         Raises:
             ValueError: When an invalid attribute is passed
         """
-        user = self.find_user_by(id=user_id)
+        return self.update_user_if({'id': user_id}, **kwargs)
 
-        for key, value in kwargs.items():
-            if not hasattr(User, key):
+    def update_user_if(self, expected: Dict[str, Any], **kwargs: Any) -> int:
+        """
+        Update the attributes of the users whose columns hold the expected
+        values, in a single UPDATE statement.
+
+        Checking and setting happen atomically, e.g. a reset token can be
+        exchanged for a new password only once:
+        update_user_if({'reset_token': token}, reset_token=None, ...)
+
+        Args:
+            expected (dict): Column values the users must have, None
+            matching NULL
+            **kwargs: Arbitrary keyword arguments
+            representing attributes to update
+
+        Returns:
+            int: The number of users updated
+
+        Raises:
+            ValueError: When an invalid attribute is passed, or no
+            expected value, which would update every user
+        """
+        for key in kwargs:
+            if key not in USER_COLUMNS:
                 raise ValueError(f"Invalid attribute: {key}")
-            setattr(user, key, value)
+        users = User.__table__
+        where = self._where(users, expected)
+        if not kwargs:
+            return 0
 
+        statement = users.update().where(where).values(**kwargs)
+        count = self._session.execute(statement).rowcount
         self._session.commit()
+        return count
+
+    @staticmethod
+    def _where(users: Table, expected: Dict[str, Any]):
+        """
+        Build the condition matching the users whose columns hold the
+        expected values.
+
+        Raises:
+            ValueError: When an invalid attribute is passed, or no
+            expected value
+        """
+        if not expected:
+            raise ValueError("No expected value")
+        for key in expected:
+            if key not in USER_COLUMNS:
+                raise ValueError(f"Invalid attribute: {key}")
+        return and_(*(users.c[key] == value
+                      for key, value in expected.items()))
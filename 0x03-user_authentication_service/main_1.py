@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+/profile latency at 10k, 100k and 1M users, with and without the
+session_id index.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import text  # noqa: E402
+
+from app import AUTH, app  # noqa: E402
+from db import _create_missing_indexes  # noqa: E402
+from user import User  # noqa: E402
+
+REQUESTS = 2000
+
+
+def add_users(engine, start: int, stop: int) -> None:
+    """
+    Insert users start..stop-1, each with a session.
+    """
+    rows = [{"email": "user{}@hbtn.io".format(i), "hashed_password": "x",
+             "session_id": "session-{}".format(i)}
+            for i in range(start, stop)]
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), rows)
+
+
+def profile_latency(client, total: int, requests: int) -> float:
+    """
+    Average latency of GET /profile in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.set_cookie("session_id",
+                          "session-{}".format(random.randrange(total)))
+        response = client.get("/profile")
+        assert response.status_code == 200
+    return (time.perf_counter() - start) * 1e6 / requests
+
+
+if __name__ == "__main__":
+    engine = AUTH._db._engine
+    client = app.test_client()
+    total = 0
+    for target in (10000, 100000, 1000000):
+        add_users(engine, total, target)
+        total = target
+        indexed = profile_latency(client, total, REQUESTS)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_users_session_id"))
+        scanned = profile_latency(client, total, max(20, REQUESTS // 100))
+        _create_missing_indexes(engine)
+        print("{:>8} users: {:>7.0f} us per /profile indexed, "
+              "{:>8.0f} us with a table scan".format(total, indexed, scanned))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Cold start of DB against an existing database of 1M users, persistent
+mode vs drop and recreate.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import DB  # noqa: E402
+from user import User  # noqa: E402
+
+USERS = 1000000
+
+if __name__ == "__main__":
+    path = os.path.join(tempfile.mkdtemp(), "users.db")
+    url = "sqlite:///" + path
+    engine = DB(url, persistent=True)._engine
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"email": "user{}@hbtn.io".format(i), "hashed_password": "x",
+             "session_id": "session-{}".format(i)} for i in range(USERS)])
+    engine.dispose()
+    size = os.path.getsize(path) / 1e6
+
+    start = time.perf_counter()
+    db = DB(url, persistent=True)
+    db.find_user_by(session_id="session-{}".format(USERS - 1))
+    elapsed = time.perf_counter() - start
+    print("persistent start on {:.0f} MB: {:.1f} ms".format(
+        size, elapsed * 1000))
+    db._engine.dispose()
+
+    start = time.perf_counter()
+    DB(url, persistent=False)._engine.dispose()
+    elapsed = time.perf_counter() - start
+    print("drop and recreate: {:.1f} ms, every user lost".format(
+        elapsed * 1000))
+    os.remove(path)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Mixed read/write throughput of the SQLite database with several threads,
+default engine vs tuned SQLite profile.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from db import DB, create_db_engine  # noqa: E402
+from user import User  # noqa: E402
+
+USERS = 10000
+THREADS = 8
+SECONDS = 3
+WRITE_RATIO = 0.2
+
+users = User.__table__
+
+
+def worker(engine, stop: threading.Event, counts: list) -> None:
+    """
+    Runs /profile-like reads and login-like writes until stopped.
+    """
+    reads = writes = errors = 0
+    while not stop.is_set():
+        user_id = random.randrange(1, USERS + 1)
+        try:
+            if random.random() < WRITE_RATIO:
+                with engine.begin() as connection:
+                    connection.execute(
+                        users.update().where(users.c.id == user_id).values(
+                            session_id="session-{}-{}".format(
+                                user_id, random.random())))
+                writes += 1
+            else:
+                with engine.connect() as connection:
+                    connection.execute(select([users.c.email]).where(
+                        users.c.session_id == "session-{}".format(
+                            user_id))).fetchall()
+                reads += 1
+        except OperationalError:
+            errors += 1
+    counts.append((reads, writes, errors))
+
+
+def run(name: str, tuned: bool, url: str) -> None:
+    """
+    Measures THREADS workers for SECONDS seconds.
+    """
+    engine = create_db_engine(url, tuned)
+    stop = threading.Event()
+    counts = []
+    threads = [threading.Thread(target=worker, args=(engine, stop, counts))
+               for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    reads, writes, errors = (sum(column) for column in zip(*counts))
+    print("{}: {:.0f} reads/s, {:.0f} writes/s, {} errors".format(
+        name, reads / SECONDS, writes / SECONDS, errors))
+
+
+if __name__ == "__main__":
+    for name, tuned in (("default", False), ("tuned", True)):
+        path = os.path.join(tempfile.mkdtemp(), "users.db")
+        url = "sqlite:///" + path
+        db = DB(url, persistent=True)
+        with db._engine.begin() as connection:
+            connection.execute(users.insert(), [
+                {"email": "user{}@hbtn.io".format(i), "hashed_password": "x",
+                 "session_id": "session-{}".format(i)}
+                for i in range(1, USERS + 1)])
+        db._engine.dispose()
+        if not tuned:
+            # DB created the file in WAL mode, go back to the defaults
+            engine = create_db_engine(url, tuned=False)
+            with engine.connect() as connection:
+                connection.execute(text("PRAGMA journal_mode = DELETE"))
+            engine.dispose()
+        run(name, tuned, url)
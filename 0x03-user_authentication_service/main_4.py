@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Concurrent logins and profile reads against the app, with 1 to 200
+threads sharing the global AUTH.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+import bcrypt  # noqa: E402
+
+from app import AUTH, app  # noqa: E402
+from user import User  # noqa: E402
+
+USERS = 400
+PROFILES = 5
+PASSWORD = "password"
+
+
+def worker(emails: list, barrier: threading.Barrier, errors: list) -> None:
+    """
+    Log each user in, then read its profile PROFILES times.
+    """
+    client = app.test_client()
+    barrier.wait()
+    for email in emails:
+        try:
+            response = client.post("/sessions", data={"email": email,
+                                                      "password": PASSWORD})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+            for _ in range(PROFILES):
+                response = client.get("/profile")
+                if response.status_code != 200 or \
+                        response.get_json() != {"email": email}:
+                    errors.append(response.status_code)
+        except Exception as error:
+            errors.append(repr(error))
+
+
+def run(threads: int, emails: list) -> None:
+    """
+    Spread the users over threads and measure the requests per second.
+    """
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+    workers = [threading.Thread(target=worker,
+                                args=(emails[i::threads], barrier, errors))
+               for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    requests = len(emails) * (1 + PROFILES)
+    print("{:>4} threads: {:>5.0f} requests/s, {} errors{}".format(
+        threads, requests / elapsed, len(errors),
+        " ({})".format(errors[0]) if errors else ""))
+
+
+if __name__ == "__main__":
+    # Cheap hashes keep the run about the database rather than bcrypt
+    hashed_password = bcrypt.hashpw(PASSWORD.encode(),
+                                    bcrypt.gensalt(4)).decode()
+    emails = ["user{}@hbtn.io".format(i) for i in range(USERS)]
+    with AUTH._db._engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"email": email, "hashed_password": hashed_password}
+            for email in emails])
+    for threads in (1, 8, 50, 200):
+        run(threads, emails)
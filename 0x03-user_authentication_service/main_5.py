@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cost of the Auth writes with 100k users: statements and latency of a
+load-then-commit update against a single UPDATE statement.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import event  # noqa: E402
+
+from auth import Auth, _generate_uuid  # noqa: E402
+from user import User  # noqa: E402
+
+USERS = 100000
+CALLS = 2000
+
+statements = []
+
+
+def load_then_commit(db, email: str) -> str:
+    """
+    create_session() as it used to be: find the user, load it, set its
+    session and commit.
+    """
+    user = db.find_user_by(email=email)
+    session_id = _generate_uuid()
+    user = db.find_user_by(id=user.id)
+    user.session_id = session_id
+    db._session.commit()
+    return session_id
+
+
+def measure(name: str, create_session) -> None:
+    """
+    Average statements and latency of CALLS sessions created.
+    """
+    del statements[:]
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        email = "user{}@hbtn.io".format(random.randrange(USERS))
+        assert create_session(email) is not None
+    elapsed = time.perf_counter() - start
+    print("{}: {:.1f} statements and {:.0f} us per session".format(
+        name, len(statements) / CALLS, elapsed * 1e6 / CALLS))
+
+
+if __name__ == "__main__":
+    auth = Auth()
+    db = auth._db
+    with db._engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"email": "user{}@hbtn.io".format(i), "hashed_password": "x"}
+            for i in range(USERS)])
+    event.listen(db._engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+
+    measure("load then commit", lambda email: load_then_commit(db, email))
+    measure("single UPDATE", auth.create_session)
+
+    token = auth.get_reset_password_token("user1@hbtn.io")
+    auth.update_password(token, "new password")
+    try:
+        auth.update_password(token, "another password")
+    except ValueError:
+        print("reset token rejected after its first use")
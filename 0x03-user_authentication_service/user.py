@@ -14,15 +14,18 @@ class User(Base):
 
     Attributes:
         id (int): Primary key, auto-incrementing integer
-        email (str): Non-nullable string for user email
+        email (str): Non-nullable unique string for user email
         hashed_password (str): Non-nullable string for hashed password
-        session_id (str): Nullable string for session identification
+        session_id (str): Nullable unique string for session identification
         reset_token (str): Nullable string for password reset token
+
+    email, session_id and reset_token are indexed, as users are looked up
+    by them on every login, profile, logout and password reset.
     """
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, index=True, unique=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, index=True, unique=True)
+    reset_token = Column(String(250), nullable=True, index=True)